@@ -0,0 +1,138 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       clock.py - time source used throughout the library
+#
+#   DESCRIPTION:
+#       All library sleeps and timestamps go through the active clock.
+#       By default this is the real clock. Simulations install a
+#       virtual clock, where sleep() advances time instantly:
+#
+#           from lib import clock
+#           clock.set_clock( clock.virtual_clock() )
+#
+#       Timeouts around real blocking I/O or condition waits use a
+#       deadline, which expires when either the active clock or real
+#       time passes it. A replayed or simulated transport that advances
+#       the virtual clock times out in virtual time, while a real port
+#       still times out in real time with a virtual clock installed.
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import threading
+import time
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class real_clock:
+    # ==================================
+    # now() - monotonic time in seconds
+    # ==================================
+    def now( self ):
+        return time.monotonic()
+
+    # ==================================
+    # sleep()
+    # ==================================
+    def sleep( self, seconds ):
+        time.sleep( seconds )
+
+
+class virtual_clock:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, start = 0.0 ):
+        self.time = start
+        self.lock = threading.Lock()
+
+    # ==================================
+    # now()
+    # ==================================
+    def now( self ):
+        return self.time
+
+    # ==================================
+    # sleep() - returns immediately after
+    # advancing virtual time
+    # ==================================
+    def sleep( self, seconds ):
+        self.advance( seconds )
+
+    # ==================================
+    # advance()
+    # ==================================
+    def advance( self, seconds ):
+        with self.lock:
+            self.time = self.time + max( seconds, 0.0 )
+
+    # ==================================
+    # set() - jump to an absolute time,
+    # used by event driven simulations
+    # ==================================
+    def set( self, new_time ):
+        with self.lock:
+            self.time = max( self.time, new_time )
+
+
+class deadline:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, timeout ):
+        self.end      = now() + timeout
+        self.real_end = time.monotonic() + timeout
+
+    # ==================================
+    # remaining() - seconds left on
+    # whichever clock runs out first
+    # ==================================
+    def remaining( self ):
+        return min( self.end - now(), self.real_end - time.monotonic() )
+
+    # ==================================
+    # expired()
+    # ==================================
+    def expired( self ):
+        return self.remaining() <= 0
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+active_clock = real_clock()
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# set_clock() - returns previous clock
+# so callers can restore it
+# ==================================
+def set_clock( new_clock ):
+    global active_clock
+    previous     = active_clock
+    active_clock = new_clock
+    return previous
+
+# ==================================
+# get_clock()
+# ==================================
+def get_clock():
+    return active_clock
+
+# ==================================
+# now()
+# ==================================
+def now():
+    return active_clock.now()
+
+# ==================================
+# sleep()
+# ==================================
+def sleep( seconds ):
+    active_clock.sleep( seconds )
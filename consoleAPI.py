@@ -13,8 +13,29 @@
 #---------------------------------------------------------------------
 #                              IMPORTS
 #--------------------------------------------------------------------- 
+import logging
+import logging.handlers
+import re
+import threading
+from collections import deque
+
 import serial
-import time
+from lib import clock
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+EXPECT_TIMEOUT = 1.0  # default time to wait for a pattern (s)
+READ_TIMEOUT   = 1    # uart read timeout used by readLine() (s)
+BATCH_TIMEOUT  = 5.0  # max time for a whole run_batch() (s)
+BATCH_IDLE     = 0.05 # batch is done once output is quiet this long (s)
+
+CAPTURE_MAX_LINES   = 10000           # lines held in the capture ring buffer
+CAPTURE_POLL_TIME   = 0.05            # capture thread read timeout (s)
+CAPTURE_LOG_BYTES   = 5 * 1024 * 1024 # rotate capture log at this size
+CAPTURE_LOG_BACKUPS = 3
+
+pattern_cache = {} # pattern str -> compiled regex, see compile_pattern()
 
 #---------------------------------------------------------------------
 #                          CLASSES
@@ -23,17 +44,32 @@ class consoleAPI:
 	__uart_conn = None
 	
 	# ==================================
-    # constructor() 
+    # constructor(): transport replaces the
+	# uart with any serial.Serial like object
+	# (see serial_replay.py)
     # ==================================	
-	def __init__(self):
-		self.__uart_conn = serial.Serial(
-							port='/dev/ttyS0',
+	def __init__(self, port = '/dev/ttyS0', transport = None ):
+		if transport is None:
+			transport = serial.Serial(
+							port=port,
 							baudrate = 115200,
 							parity=serial.PARITY_NONE,
 							stopbits=serial.STOPBITS_ONE,
 							bytesize=serial.EIGHTBITS,
-							timeout=1
+							timeout=READ_TIMEOUT
 							)
+		else:
+			transport.timeout = READ_TIMEOUT
+		self.__uart_conn = transport
+
+		#capture state, see start_capture()
+		self.capture_thread  = None
+		self.capture_stop    = threading.Event()
+		self.capture_cond    = threading.Condition()
+		self.capture_lines   = deque() # ( timestamp, raw line ), oldest first
+		self.capture_count   = 0       # total lines captured (including dropped)
+		self.capture_partial = ""      # text after the last line end
+		self.capture_log     = None
 	# ==================================
     # writeLine() 
     # ==================================	
@@ -51,7 +87,7 @@ class consoleAPI:
 		# write message
 		# ------------------------------------
 		self.__uart_conn.write( hex_list )
-		time.sleep(.1)
+		clock.sleep(.1)
 	
 	# ==================================
     # readLine(): Used to manually read
@@ -61,6 +97,8 @@ class consoleAPI:
 	# if it has not been flushed. 
     # ==================================
 	def readLine(self, read_limit_size: int ) -> ' str':
+		if self.capture_thread is not None:
+			raise( RuntimeError( "readLine() is not available while capturing, use get_lines()" ) )
 		return self.__uart_conn.read( read_limit_size )
 	
 	# ==================================
@@ -76,8 +114,16 @@ class consoleAPI:
 		# ------------------------------------
 		# write line
 		# ------------------------------------
+		start = self.capture_count
 		self.writeLine( in_str, auto_return_carrige )
 
+		# ------------------------------------
+		# capture thread owns the port, take
+		# the response from the ring buffer
+		# ------------------------------------
+		if self.capture_thread is not None:
+			return self.__capture_read( start, read_limit )
+
 		# ------------------------------------
 		# read line and decode
 		# ------------------------------------
@@ -87,12 +133,332 @@ class consoleAPI:
 		return return_str
 	
 	# ==================================
-    # clear_connection() 
+    # send_and_expect(): writes a command and
+	# reads until pattern (str or compiled
+	# regex) matches. Returns the match, whose
+	# .string holds everything read, or None
+	# on timeout
+    # ==================================
+	def send_and_expect(self, in_str, pattern, timeout = EXPECT_TIMEOUT ) -> 're.Match':
+		regex = compile_pattern( pattern )
+
+		# ------------------------------------
+		# drop stale input and clear any partial
+		# command on the pico in the same write
+		# as the command itself, no sleeps.
+		# When capturing, stale input is kept
+		# and skipped instead
+		# ------------------------------------
+		start = self.capture_count
+		if self.capture_thread is None:
+			self.__uart_conn.reset_input_buffer()
+		self.__uart_conn.write( [ ord('\r') ] + self.__str_to_hex_list( in_str ) + [ ord('\r') ] )
+
+		if self.capture_thread is not None:
+			return self.__capture_expect( regex, start, timeout )
+		return self.expect( regex, timeout )
+
+	# ==================================
+    # expect(): reads until pattern matches
+	# or timeout expires
+    # ==================================
+	def expect(self, pattern, timeout = EXPECT_TIMEOUT ) -> 're.Match':
+		if self.capture_thread is not None:
+			return self.__capture_expect( compile_pattern( pattern ), self.capture_count, timeout )
+
+		regex        = compile_pattern( pattern )
+		deadline     = clock.deadline( timeout )
+		received     = ""
+		read_timeout = self.__uart_conn.timeout
+
+		try:
+			while True:
+				remaining = deadline.remaining()
+				if remaining <= 0:
+					return None
+
+				# ------------------------------------
+				# read whatever is waiting (at least
+				# one byte) so we return as soon as the
+				# pattern is in
+				# ------------------------------------
+				self.__uart_conn.timeout = remaining
+				chunk = self.__uart_conn.read( max( 1, self.__uart_conn.in_waiting ) )
+				if len( chunk ) == 0:
+					continue
+
+				received = received + chunk.decode( "utf-8", errors="replace" )
+				match    = regex.search( received )
+				if match is not None:
+					return match
+		finally:
+			self.__uart_conn.timeout = read_timeout
+
+	# ==================================
+    # run_batch(): sends every command in one
+	# write and splits the combined output on
+	# the echoed command lines. Returns a list
+	# of ( cmd, output, passed ), where passed
+	# is None when the command has no pattern
+    # ==================================
+	def run_batch(self, cmds, pass_patterns = None, timeout = BATCH_TIMEOUT ) -> 'list':
+		if len( cmds ) == 0:
+			return []
+		if pass_patterns is None:
+			pass_patterns = [ None ] * len( cmds )
+		if len( pass_patterns ) != len( cmds ):
+			raise( ValueError( "run_batch() needs one pass pattern (or None) per command" ) )
+
+		echoes = [ compile_pattern( r"(?m)^" + re.escape( cmd ) + r"\r?\n" ) for cmd in cmds ]
+		last_pattern = None if pass_patterns[-1] is None else compile_pattern( pass_patterns[-1] )
+
+		# ------------------------------------
+		# one write for the whole batch, the
+		# leading carriage return clears any
+		# partial command on the pico
+		# ------------------------------------
+		start = self.capture_count
+		if self.capture_thread is None:
+			self.__uart_conn.reset_input_buffer()
+		self.__uart_conn.write( self.__str_to_hex_list( "\r" + "\r".join( cmds ) + "\r" ) )
+
+		# ------------------------------------
+		# read until every echo is in and the
+		# last command passed or went quiet
+		# ------------------------------------
+		deadline = clock.deadline( timeout )
+		text     = ""
+		idle     = clock.deadline( BATCH_IDLE )
+		while True:
+			new_text = self.__batch_read( start, text )
+			if new_text != text:
+				text = new_text
+				idle = clock.deadline( BATCH_IDLE )
+
+			outputs = self.__split_batch( text, echoes )
+			if outputs[-1] is not None:
+				if last_pattern is not None and last_pattern.search( outputs[-1] ) is not None:
+					break
+				if idle.expired():
+					break
+
+			if deadline.expired():
+				break
+
+		# ------------------------------------
+		# check each command's output
+		# ------------------------------------
+		results = []
+		for cmd, output, pattern in zip( cmds, outputs, pass_patterns ):
+			passed = None
+			if pattern is not None:
+				passed = ( output is not None and compile_pattern( pattern ).search( output ) is not None )
+			results.append( ( cmd, "" if output is None else output, passed ) )
+
+		return results
+
+	# ==================================
+    # clear_connection()
     # ==================================
 	def clear_connection(self) -> 'None':
 		self.__uart_conn.write( [ ord('\r') ] )
-		time.sleep(.1)
-		self.__uart_conn.flushInput()
+		clock.sleep(.1)
+
+		# ------------------------------------
+		# nothing to flush when capturing, any
+		# unsolicited output is kept as evidence
+		# ------------------------------------
+		if self.capture_thread is None:
+			self.__uart_conn.flushInput()
+
+	# ==================================
+    # start_capture(): continuously reads the
+	# uart into a timestamped ring buffer and,
+	# if log_path is given, a rotating log
+    # ==================================
+	def start_capture(self, max_lines = CAPTURE_MAX_LINES, log_path = None, log_max_bytes = CAPTURE_LOG_BYTES, log_backups = CAPTURE_LOG_BACKUPS ) -> 'None':
+		if self.capture_thread is not None:
+			return
+
+		if log_path is not None:
+			self.capture_log = logging.handlers.RotatingFileHandler( log_path, maxBytes=log_max_bytes, backupCount=log_backups )
+
+		self.capture_lines = deque( self.capture_lines, maxlen=max_lines )
+		self.__uart_conn.timeout = CAPTURE_POLL_TIME
+		self.capture_stop.clear()
+		self.capture_thread = threading.Thread( target=self.__capture_run, daemon=True )
+		self.capture_thread.start()
+
+	# ==================================
+    # stop_capture(): captured lines are
+	# kept until the next start_capture()
+    # ==================================
+	def stop_capture(self) -> 'None':
+		if self.capture_thread is None:
+			return
+
+		self.capture_stop.set()
+		self.capture_thread.join()
+		self.capture_thread = None
+		self.__uart_conn.timeout = READ_TIMEOUT
+
+		if self.capture_log is not None:
+			self.capture_log.close()
+			self.capture_log = None
+
+	# ==================================
+    # wait_for(): waits for a captured line
+	# matching pattern. Only lines captured
+	# after the call are checked unless
+	# since (a timestamp) is given. Returns
+	# ( timestamp, match ) or None on timeout
+    # ==================================
+	def wait_for(self, pattern, timeout = EXPECT_TIMEOUT, since = None ) -> 'tuple':
+		regex    = compile_pattern( pattern )
+		deadline = clock.deadline( timeout )
+
+		with self.capture_cond:
+			next_line = self.capture_count
+			if since is not None:
+				next_line = self.capture_count - sum( 1 for timestamp, line in self.capture_lines if timestamp >= since )
+
+			while True:
+				for timestamp, line in self.__lines_from( next_line ):
+					match = regex.search( line.rstrip( "\r\n" ) )
+					if match is not None:
+						return ( timestamp, match )
+				next_line = self.capture_count
+
+				remaining = deadline.remaining()
+				if remaining <= 0 or self.capture_thread is None:
+					return None
+				self.capture_cond.wait( remaining )
+
+	# ==================================
+    # get_lines(): captured lines within
+	# [start_time, end_time] as
+	# ( timestamp, line ), oldest first
+    # ==================================
+	def get_lines(self, start_time = None, end_time = None ) -> 'list':
+		with self.capture_cond:
+			return [ ( timestamp, line.rstrip( "\r\n" ) ) for timestamp, line in self.capture_lines
+					 if ( start_time is None or timestamp >= start_time ) and ( end_time is None or timestamp <= end_time ) ]
+
+	# ==================================
+    # helper function: __capture_run()
+    # ==================================
+	def __capture_run(self) -> 'None':
+		while not self.capture_stop.is_set():
+			chunk = self.__uart_conn.read( max( 1, self.__uart_conn.in_waiting ) )
+			if len( chunk ) == 0:
+				continue
+
+			timestamp = clock.now()
+			text      = self.capture_partial + chunk.decode( "utf-8", errors="replace" )
+			lines     = text.split( "\n" )
+
+			with self.capture_cond:
+				self.capture_partial = lines.pop()
+				for line in lines:
+					self.capture_lines.append( ( timestamp, line + "\n" ) )
+					if self.capture_log is not None:
+						self.capture_log.handle( logging.makeLogRecord( { 'msg': "{:.6f} {}".format( timestamp, line.rstrip( "\r" ) ) } ) )
+				self.capture_count = self.capture_count + len( lines )
+				self.capture_cond.notify_all()
+
+	# ==================================
+    # helper function: __capture_expect()
+	# matches pattern against everything
+	# captured since line index start
+	# (including a trailing partial line,
+	# so prompts without a line end match)
+    # ==================================
+	def __capture_expect(self, regex, start, timeout ) -> 're.Match':
+		deadline = clock.deadline( timeout )
+
+		with self.capture_cond:
+			while True:
+				match = regex.search( self.__capture_text( start ) )
+				if match is not None:
+					return match
+
+				remaining = deadline.remaining()
+				if remaining <= 0 or self.capture_thread is None:
+					return None
+				self.capture_cond.wait( remaining )
+
+	# ==================================
+    # helper function: __capture_read(): like
+	# a uart read, returns read_limit chars
+	# or whatever arrived once the output
+	# goes quiet for BATCH_IDLE, giving up
+	# after READ_TIMEOUT if nothing arrives
+    # ==================================
+	def __capture_read(self, start, read_limit) -> 'str':
+		deadline = clock.deadline( READ_TIMEOUT )
+		text     = ""
+		while True:
+			new_text = self.__batch_read( start, text )
+			if len( new_text ) >= read_limit:
+				return new_text[:read_limit]
+			if ( len( new_text ) != 0 and new_text == text ) or deadline.expired():
+				return new_text
+			text = new_text
+
+	# ==================================
+    # helper function: __capture_text()
+    # ==================================
+	def __capture_text(self, start) -> 'str':
+		with self.capture_cond:
+			return "".join( line for timestamp, line in self.__lines_from( start ) ) + self.capture_partial
+
+	# ==================================
+    # helper function: __lines_from(): lines
+	# with absolute index >= start that are
+	# still in the ring buffer
+    # ==================================
+	def __lines_from(self, start) -> 'list':
+		first = self.capture_count - len( self.capture_lines )
+		return list( self.capture_lines )[ max( start - first, 0 ): ]
+
+	# ==================================
+    # helper function: __batch_read(): returns
+	# text with any newly received data added
+    # ==================================
+	def __batch_read(self, start, text) -> 'str':
+		if self.capture_thread is not None:
+			with self.capture_cond:
+				self.capture_cond.wait( BATCH_IDLE )
+				return self.__capture_text( start )
+
+		read_timeout = self.__uart_conn.timeout
+		try:
+			self.__uart_conn.timeout = BATCH_IDLE
+			chunk = self.__uart_conn.read( max( 1, self.__uart_conn.in_waiting ) )
+		finally:
+			self.__uart_conn.timeout = read_timeout
+		return text + chunk.decode( "utf-8", errors="replace" )
+
+	# ==================================
+    # helper function: __split_batch(): output
+	# following each echo, up to the next one.
+	# None for commands not echoed (yet)
+    # ==================================
+	def __split_batch(self, text, echoes) -> 'list':
+		spans = []
+		pos   = 0
+		for echo in echoes:
+			match = echo.search( text, pos )
+			if match is None:
+				break
+			spans.append( match.span() )
+			pos = match.end()
+
+		outputs = [ None ] * len( echoes )
+		for i in range( len( spans ) ):
+			end = spans[i + 1][0] if i + 1 < len( spans ) else len( text )
+			outputs[i] = text[ spans[i][1] : end ]
+		return outputs
 
 	# ==================================
     # helper function: str_to_hex()
@@ -102,4 +468,19 @@ class consoleAPI:
 		for i in in_str:
 			hex_list.append( ord( i ) )
 
-		return hex_list
\ No newline at end of file
+		return hex_list
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# compile_pattern(): compiles each pattern
+# once, compiled regexes pass through
+# ==================================
+def compile_pattern( pattern ):
+	if not isinstance( pattern, str ):
+		return pattern
+
+	if pattern not in pattern_cache:
+		pattern_cache[ pattern ] = re.compile( pattern )
+	return pattern_cache[ pattern ]
@@ -0,0 +1,213 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       hw.py - GPIO/SPI hardware access layer
+#
+#   DESCRIPTION:
+#       pi_pico and msgAPI get their GPIO and SPI through here, so the
+#       whole library imports and runs off the Pi. The provider is picked
+#       at runtime from the STF_HW environment variable or set_mode():
+#
+#           real - RPi.GPIO and spidev (default)
+#           sim  - sim_gpio below and the sx127x_sim radio model
+#           auto - real when RPi.GPIO and spidev import, else sim
+#
+#       The simulator is never picked silently: a rig with a broken
+#       RPi.GPIO/spidev install fails on import in real mode, auto warns
+#       when it falls back, and results records the mode in use.
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import os
+import threading
+
+from lib import clock
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+HW_ENV_VAR = "STF_HW"
+HW_MODES   = [ "real", "sim", "auto" ]
+HW_DEFAULT = "real" # mode used when STF_HW is not set
+
+active_mode = None # resolved mode, "real" or "sim", see get_mode()
+sim_gpio_provider = None
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class sim_gpio:
+    # RPi.GPIO constants
+    BCM      = 11
+    BOARD    = 10
+    OUT      = 0
+    IN       = 1
+    LOW      = 0
+    HIGH     = 1
+    PUD_OFF  = 20
+    PUD_DOWN = 21
+    PUD_UP   = 22
+
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.pins      = {}  # pin -> [ direction, level ]
+        self.log       = []  # ( time, pin, level ) for every output change
+        self.callbacks = {}  # pin -> [ fn( pin, level ) ], see add_callback()
+        self.mode      = None
+
+    # ==================================
+    # setmode()
+    # ==================================
+    def setmode( self, mode ):
+        self.mode = mode
+
+    # ==================================
+    # setwarnings()
+    # ==================================
+    def setwarnings( self, enabled ):
+        pass
+
+    # ==================================
+    # setup()
+    # ==================================
+    def setup( self, pin, direction, pull_up_down = PUD_OFF, initial = LOW ):
+        with self.lock:
+            level = initial
+            if direction == self.IN:
+                level = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+            if pin in self.pins and direction == self.IN:
+                level = self.pins[ pin ][1] # keep a level a sim DUT already drives
+            self.pins[ pin ] = [ direction, level ]
+
+    # ==================================
+    # output() - logs the change and lets
+    # a simulated DUT react to it
+    # ==================================
+    def output( self, pin, level ):
+        with self.lock:
+            if pin not in self.pins or self.pins[ pin ][0] != self.OUT:
+                raise( RuntimeError( "GPIO {} has not been set up as an output".format( pin ) ) )
+            self.pins[ pin ][1] = level
+            self.log.append( ( clock.now(), pin, level ) )
+            callbacks = list( self.callbacks.get( pin, [] ) )
+
+        for callback in callbacks:
+            callback( pin, level )
+
+    # ==================================
+    # input()
+    # ==================================
+    def input( self, pin ):
+        with self.lock:
+            if pin not in self.pins:
+                raise( RuntimeError( "GPIO {} has not been set up".format( pin ) ) )
+            return self.pins[ pin ][1]
+
+    # ==================================
+    # cleanup()
+    # ==================================
+    def cleanup( self, pin = None ):
+        with self.lock:
+            if pin is None:
+                self.pins = {}
+            else:
+                self.pins.pop( pin, None )
+
+    # ==================================
+    # add_callback() - fn( pin, level ) on
+    # every output() to pin
+    # ==================================
+    def add_callback( self, pin, fn ):
+        with self.lock:
+            self.callbacks.setdefault( pin, [] ).append( fn )
+
+    # ==================================
+    # drive() - a simulated DUT sets the
+    # level seen on one of our inputs
+    # ==================================
+    def drive( self, pin, level ):
+        with self.lock:
+            if pin in self.pins:
+                self.pins[ pin ][1] = level
+            else:
+                self.pins[ pin ] = [ self.IN, level ]
+
+    # ==================================
+    # toggles() - logged output changes,
+    # optionally for one pin
+    # ==================================
+    def toggles( self, pin = None ):
+        with self.lock:
+            return [ entry for entry in self.log if pin is None or entry[1] == pin ]
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# set_mode() - must be called before any
+# GPIO/SPI handles are created
+# ==================================
+def set_mode( mode ):
+    global active_mode
+    if mode not in HW_MODES:
+        raise( ValueError( "hw mode must be one of {}, not {}".format( HW_MODES, mode ) ) )
+    active_mode = __resolve( mode )
+    return active_mode
+
+# ==================================
+# get_mode()
+# ==================================
+def get_mode():
+    global active_mode
+    if active_mode is None:
+        active_mode = __resolve( os.environ.get( HW_ENV_VAR, HW_DEFAULT ) )
+    return active_mode
+
+# ==================================
+# get_gpio() - RPi.GPIO or the shared
+# sim_gpio
+# ==================================
+def get_gpio():
+    global sim_gpio_provider
+    if get_mode() == "real":
+        import RPi.GPIO as GPIO
+        return GPIO
+
+    if sim_gpio_provider is None:
+        sim_gpio_provider = sim_gpio()
+    return sim_gpio_provider
+
+# ==================================
+# get_spi() - new, unopened SpiDev
+# ==================================
+def get_spi():
+    if get_mode() == "real":
+        import spidev
+        return spidev.SpiDev()
+
+    from lib.util import sx127x_sim
+    return sx127x_sim.SpiDev()
+
+# ==================================
+# __resolve()
+# ==================================
+def __resolve( mode ):
+    if mode not in HW_MODES:
+        raise( ValueError( "{} must be one of {}, not {}".format( HW_ENV_VAR, HW_MODES, mode ) ) )
+    if mode != "auto":
+        return mode
+
+    try:
+        import RPi.GPIO
+        import spidev
+    except ( ImportError, RuntimeError ) as error:
+        print( "WARNING: hw mode auto could not load RPi.GPIO/spidev ({}), using the SIMULATED GPIO and radio".format( error ) )
+        return "sim"
+    return "real"
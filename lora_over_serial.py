@@ -7,6 +7,24 @@
 #   DESCRIPTION:
 #       Provides message API functionality
 #
+#       The bridge speaks a text CLI ("lora send 0x01 ...") and an
+#       optional binary mode, entered with the text command
+#       "lora binary". In binary mode each packet is SLIP framed:
+#
+#           END | cmd | tag | len | data[len] | END     (escaped)
+#
+#       Responses echo the tag with BIN_RSP_FLAG set in cmd, or
+#       BIN_RSP_ERROR on failure. BIN_CMD_TEXT returns to text mode.
+#
+#       start_pipeline() allows several commands in flight at once.
+#       submit() returns a future per command; responses are matched
+#       back by tag (binary) or by order and command echo (text):
+#
+#           tx  = l_serial.submit( "lora send 0x01 0x02" )
+#           rx  = l_serial.submit( "lora init rx" )
+#           get = l_serial.submit( "lora get" )
+#           print( get.result() )
+#
 #   Copyright 2025 by Nate Lenze
 #*********************************************************************
 
@@ -17,12 +35,135 @@
 #---------------------------------------------------------------------
 import serial
 import serial.tools.list_ports
-import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from lib import clock
 
 #---------------------------------------------------------------------
 #                             VARIABLES
 #---------------------------------------------------------------------
 MAX_SER_TIMEOUT = 10  #in 1/10 of a sec, 10 = 1s
+SER_LINE_END    = b"\r\n"
+PIPELINE_WINDOW = 4   #default max commands in flight
+
+# SLIP framing (RFC 1055)
+SLIP_END        = 0xC0
+SLIP_ESC        = 0xDB
+SLIP_ESC_END    = 0xDC
+SLIP_ESC_ESC    = 0xDD
+
+# binary mode commands/responses
+BIN_CMD_SEND    = 0x01
+BIN_CMD_GET     = 0x02
+BIN_CMD_INIT_RX = 0x03
+BIN_CMD_TEXT    = 0x04
+BIN_RSP_FLAG    = 0x80
+BIN_RSP_ERROR   = 0xFF
+
+BIN_HEADER_SIZE = 3     # cmd, tag, len
+BIN_MAX_DATA    = 0xFF
+BIN_MAX_PACKET  = BIN_HEADER_SIZE + BIN_MAX_DATA
+BIN_MAX_FRAME   = 2 + 2 * BIN_MAX_PACKET  # worst case, every byte escaped
+BIN_RX_QUEUE    = 16    # unclaimed responses kept for later bin_read() calls
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# slip_pack() - builds a framed binary
+# packet into a preallocated buffer,
+# returns the number of bytes used
+# ==================================
+def slip_pack( out, cmd, tag, data ):
+	size = 0
+	out[size] = SLIP_END
+	size = size + 1
+
+	for byte in ( cmd, tag, len(data) ):
+		size = slip_escape_into( out, size, byte )
+	for byte in data:
+		size = slip_escape_into( out, size, byte )
+
+	out[size] = SLIP_END
+	return size + 1
+
+def slip_escape_into( out, size, byte ):
+	if byte == SLIP_END:
+		out[size]     = SLIP_ESC
+		out[size + 1] = SLIP_ESC_END
+		return size + 2
+	if byte == SLIP_ESC:
+		out[size]     = SLIP_ESC
+		out[size + 1] = SLIP_ESC_ESC
+		return size + 2
+	out[size] = byte
+	return size + 1
+
+# ==================================
+# parse_bin_packet() - returns
+# ( cmd, tag, data ) or None if the
+# packet is malformed
+# ==================================
+def parse_bin_packet( packet ):
+	if len(packet) < BIN_HEADER_SIZE or len(packet) != BIN_HEADER_SIZE + packet[2]:
+		return None
+	return packet[0], packet[1], packet[BIN_HEADER_SIZE:]
+
+# ==================================
+# parse_bin_response() - as
+# parse_bin_packet() but also None if
+# the packet is not a response
+# ==================================
+def parse_bin_response( packet ):
+	parsed = parse_bin_packet( packet )
+	if parsed is None or not ( parsed[0] & BIN_RSP_FLAG ):
+		return None
+	return parsed
+
+#---------------------------------------------------------------------
+#                          HELPER CLASSES
+#---------------------------------------------------------------------
+class slip_decoder:
+    # ==================================
+    # Constructor
+    # ==================================
+	def __init__(self, max_size=BIN_MAX_PACKET ):
+		self.buf      = bytearray( max_size )
+		self.size     = 0
+		self.escaped  = False
+		self.overflow = False
+
+    # ==================================
+    # feed() - returns list of complete
+    # (unescaped) packets
+    # ==================================
+	def feed(self, data ):
+		packets = []
+		for byte in data:
+			if byte == SLIP_END:
+				#empty packets are just frame delimiters
+				if self.size != 0 and not self.overflow:
+					packets.append( bytes( self.buf[:self.size] ) )
+				self.size     = 0
+				self.escaped  = False
+				self.overflow = False
+				continue
+
+			if self.escaped:
+				byte = SLIP_END if byte == SLIP_ESC_END else SLIP_ESC if byte == SLIP_ESC_ESC else byte
+				self.escaped = False
+			elif byte == SLIP_ESC:
+				self.escaped = True
+				continue
+
+			if self.size >= len(self.buf):
+				self.overflow = True
+				continue
+			self.buf[self.size] = byte
+			self.size = self.size + 1
+
+		return packets
 
 #---------------------------------------------------------------------
 #                              CLASSES
@@ -31,18 +172,40 @@ class lora_serial:
     # ==================================
     # Constructor
     # ==================================
-	def __init__(self, port="/dev/tty.usbmodem1401", baud=115200, debug_prints=False ):
+	def __init__(self, port="/dev/tty.usbmodem1401", baud=115200, debug_prints=False, binary=False ):
 	# def __init__(self, port="/dev/cu.usbmodem1101", baud=115200, debug_prints=False ):
 		self.print_cmds = debug_prints
-		self.ser_conn = serial.Serial(port=port, baudrate=115200, timeout=0)
+
+		#binary mode state, buffers are allocated once and reused
+		self.binary     = False
+		self.bin_tag    = 0
+		self.tx_buf     = bytearray( BIN_MAX_FRAME )
+		self.rx_decoder = slip_decoder()
+		self.rx_packets = deque( maxlen=BIN_RX_QUEUE ) # ( cmd, tag, data ) decoded but not yet claimed
+
+		#pipeline state, see start_pipeline()
+		self.pipeline_thread  = None
+		self.pipeline_stop    = threading.Event()
+		self.pipeline_window  = None
+		self.pipeline_lock    = threading.Lock()
+		self.pending_text     = deque() # [ cmd, future, deadline ] in send order
+		self.pending_bin      = {}      # tag -> [ cmd, future, deadline ]
+
+		#reads block in the driver (up to MAX_SER_TIMEOUT) and return as
+		#soon as the expected data is in
+		self.ser_conn = serial.Serial(port=port, baudrate=115200, timeout=MAX_SER_TIMEOUT / 10)
 		self.ser_conn.close()
 		self.ser_conn.open()
 		self.ser_conn.flush()
 		self.send_cmd( "junkcmd" ) #clear out command buffer and flush
 		self.read_and_return()
 		self.glb_dbg = [] #allows you to see full response (helpful for debugging)
-		
-		raise("for whatever reason we miss the first Rx over lora on a switch. for mailboxAPI this means we miss ACKS. this may be due to the speed of TX/RX")
+
+		if binary:
+			self.enter_binary_mode()
+
+		#NOTE: for whatever reason we miss the first Rx over lora on a switch. for
+		#mailboxAPI this means we miss ACKS. this may be due to the speed of TX/RX
 		
     # ==================================
     # x()
@@ -74,8 +237,13 @@ class lora_serial:
 		return self.LoraReadMessageMulti()
 
 	def LoraReadMessageMulti(self):
-		self.send_cmd( "lora get")
-		response = self.read_and_return()
+		if self.binary:
+			rsp = self.bin_cmd( BIN_CMD_GET )
+			if rsp is None or rsp[0] == BIN_RSP_ERROR:
+				return []
+			return list( rsp[1] )
+
+		response = self.command( "lora get" )
 
 		if response[:5] == "Error":
 			return []
@@ -97,8 +265,11 @@ class lora_serial:
 		self.LoraSetRxMode()
 
 	def LoraSetRxMode(self):
-		self.send_cmd( "lora init rx" )
-		self.read_and_return()
+		if self.binary:
+			self.bin_cmd( BIN_CMD_INIT_RX )
+			return
+
+		self.command( "lora init rx" )
 		
 
     # ==================================
@@ -108,34 +279,284 @@ class lora_serial:
 		return self.LoraSendMessage( messageList, messageSize)
 	
 	def LoraSendMessage( self, messageList, messageSize):
+		if self.binary:
+			self.bin_cmd( BIN_CMD_SEND, messageList[:messageSize] )
+			return
+
 		command = "lora send"
 		for item in messageList:
 			#NOTE: lora_serial is hardcoded to rx 4 char (0x00), you MUST pad out hex values!
 			command = command + " " + f'{item:#0{4}x}'
 
-		self.send_cmd( command )
-		response = self.read_and_return()
-		pass
+		response = self.command( command )
 
     # ==================================
     # x()
     # ==================================
 	def read_and_return(self, ignore_full_response=False ):
-		response = self.ser_conn.read(10000).decode('utf-8') #.split("\r\n")
-		timeout_cnt = 0
 		if( ignore_full_response ):
+			#drain whatever is buffered without blocking
+			self.ser_conn.read( self.ser_conn.in_waiting )
 			return ['']
+
 		# wait for a full response to come in. This is signified 
-		# by 2x return lines: 1) orginal msg, 2) response 
-		while( response.count("\r\n") < 2 and timeout_cnt <= MAX_SER_TIMEOUT ):
-			time.sleep(.1)
-			timeout_cnt = timeout_cnt + 1 
-			response = response + self.ser_conn.read(10000).decode('utf-8') #.split("\r\n")
-		
-		response = response.split("\r\n")
+		# by 2x return lines: 1) orginal msg, 2) response. read_until()
+		# blocks until a line completes (or the port timeout) so we
+		# return as soon as the response is in
+		response = []
+		pending  = b""
+		deadline = clock.deadline( MAX_SER_TIMEOUT / 10 )
+		while( len(response) < 2 ):
+			chunk = self.ser_conn.read_until( SER_LINE_END )
+			pending = pending + chunk
+			if pending.endswith( SER_LINE_END ):
+				response.append( pending[:-len(SER_LINE_END)].decode('utf-8') )
+				pending = b""
+			elif len(chunk) == 0 or deadline.expired():
+				#port timed out
+				break
+
 		self.glb_dbg = response
+		if len(response) < 2:
+			return ""
 		return response[1]
 
+    # ==================================
+    # enter_binary_mode()
+    # ==================================
+	def enter_binary_mode(self):
+		response = self.command( "lora binary" )
+		if response[:5] == "Error" or response == "":
+			print( "bridge does not support binary mode: {}".format( response ) )
+			return False
+
+		self.binary = True
+		return True
+
+    # ==================================
+    # exit_binary_mode()
+    # ==================================
+	def exit_binary_mode(self):
+		self.bin_cmd( BIN_CMD_TEXT )
+		self.binary = False
+
+    # ==================================
+    # bin_cmd() - sends a binary command
+    # and returns ( rsp cmd, data ) or
+    # None on timeout
+    # ==================================
+	def bin_cmd(self, cmd, data=b"" ):
+		if self.pipeline_thread is not None:
+			try:
+				return self.submit( cmd, data ).result()
+			except TimeoutError:
+				return None
+
+		self.bin_tag = ( self.bin_tag + 1 ) & 0xFF
+		size = slip_pack( self.tx_buf, cmd, self.bin_tag, data )
+
+		if self.print_cmds == True:
+			print( "sending binary command: {} tag {} data {}".format( cmd, self.bin_tag, list(data) ) )
+		self.ser_conn.write( memoryview( self.tx_buf )[:size] )
+
+		return self.bin_read( self.bin_tag )
+
+    # ==================================
+    # bin_read() - waits for the response
+    # with the given tag
+    # ==================================
+	def bin_read(self, tag ):
+		deadline  = clock.deadline( MAX_SER_TIMEOUT / 10 )
+		timed_out = False
+		while( True ):
+			#a response may already have come in with an earlier chunk
+			parsed = self.__claim_response( tag )
+			if parsed is not None:
+				return parsed[0], parsed[2]
+			if timed_out:
+				return None
+
+			chunk = self.ser_conn.read( max( 1, self.ser_conn.in_waiting ) )
+			for packet in self.rx_decoder.feed( chunk ):
+				parsed = parse_bin_response( packet )
+				if parsed is None:
+					#malformed or not a response, drop
+					continue
+				#keep every response, later calls may be waiting on them
+				self.rx_packets.append( parsed )
+
+			#port timed out, the last chunk is still checked
+			timed_out = len(chunk) == 0 or deadline.expired()
+
+    # ==================================
+    # __claim_response() - removes and
+    # returns the queued response with
+    # the given tag, if any
+    # ==================================
+	def __claim_response(self, tag ):
+		for parsed in self.rx_packets:
+			if parsed[1] == tag:
+				self.rx_packets.remove( parsed )
+				return parsed
+		return None
+
+    # ==================================
+    # command() - sends a text command and
+    # returns the response line
+    # ==================================
+	def command(self, cmd ):
+		if self.pipeline_thread is not None:
+			try:
+				return self.submit( cmd ).result()
+			except TimeoutError:
+				return ""
+
+		self.send_cmd( cmd )
+		return self.read_and_return()
+
+    # ==================================
+    # start_pipeline() - starts the reader
+    # thread, allowing up to window
+    # commands in flight
+    # ==================================
+	def start_pipeline(self, window=PIPELINE_WINDOW ):
+		if self.pipeline_thread is not None:
+			return
+
+		self.flush_buffer()
+		self.rx_packets.clear()
+		self.pipeline_window = threading.BoundedSemaphore( window )
+		self.pipeline_stop.clear()
+		self.pipeline_thread = threading.Thread( target=self.__pipeline_reader, daemon=True )
+		self.pipeline_thread.start()
+
+    # ==================================
+    # stop_pipeline()
+    # ==================================
+	def stop_pipeline(self ):
+		if self.pipeline_thread is None:
+			return
+
+		self.pipeline_stop.set()
+		self.pipeline_thread.join()
+		self.pipeline_thread = None
+		self.__expire_pending( force=True )
+
+    # ==================================
+    # submit() - queues a command without
+    # waiting for its response. cmd is a
+    # string in text mode or a BIN_CMD_x
+    # in binary mode. Blocks while the
+    # window is full
+    # ==================================
+	def submit(self, cmd, data=b"" ):
+		if self.pipeline_thread is None:
+			raise( RuntimeError( "start_pipeline() must be called before submit()" ) )
+
+		self.pipeline_window.acquire()
+		future = Future()
+
+		# keep registration and write in the same order for text mode
+		with self.pipeline_lock:
+			deadline = clock.deadline( MAX_SER_TIMEOUT / 10 )
+			if self.binary:
+				self.bin_tag = ( self.bin_tag + 1 ) & 0xFF
+				self.pending_bin[ self.bin_tag ] = [ cmd, future, deadline ]
+				size = slip_pack( self.tx_buf, cmd, self.bin_tag, data )
+				self.ser_conn.write( memoryview( self.tx_buf )[:size] )
+			else:
+				self.pending_text.append( [ cmd, future, deadline ] )
+				self.send_cmd( cmd )
+
+		return future
+
+    # ==================================
+    # in_flight() - commands awaiting a
+    # response
+    # ==================================
+	def in_flight(self ):
+		with self.pipeline_lock:
+			return len( self.pending_text ) + len( self.pending_bin )
+
+    # ==================================
+    # __pipeline_reader()
+    # ==================================
+	def __pipeline_reader(self ):
+		pending = b""
+		echo    = None # pending entry whose echo was just read (text mode)
+
+		while not self.pipeline_stop.is_set():
+			chunk = self.ser_conn.read( max( 1, self.ser_conn.in_waiting ) )
+
+			if self.binary:
+				for packet in self.rx_decoder.feed( chunk ):
+					parsed = parse_bin_response( packet )
+					if parsed is None:
+						continue
+					with self.pipeline_lock:
+						entry = self.pending_bin.pop( parsed[1], None )
+					if entry is not None:
+						self.__complete( entry, ( parsed[0], parsed[2] ) )
+			else:
+				# ----------------------------
+				# Each response is 2 lines:
+				# 1) command echo, 2) response
+				# ----------------------------
+				pending = pending + chunk
+				while SER_LINE_END in pending:
+					line, pending = pending.split( SER_LINE_END, 1 )
+					line = line.decode( 'utf-8' )
+
+					with self.pipeline_lock:
+						head = self.pending_text[0] if len( self.pending_text ) != 0 else None
+						if echo is not None and head is echo:
+							self.pending_text.popleft()
+
+					# ------------------------
+					# The response only belongs
+					# to the echoed entry. If that
+					# expired meanwhile the line
+					# may be the next echo instead
+					# ------------------------
+					if echo is not None and head is echo:
+						echo = None
+						self.__complete( head, line )
+						continue
+					echo = None
+
+					#unsolicited output, not a command echo
+					if head is None or line != head[0]:
+						continue
+					echo = head
+
+			self.__expire_pending()
+
+    # ==================================
+    # __complete()
+    # ==================================
+	def __complete(self, entry, result ):
+		cmd, future, deadline = entry
+		if self.print_cmds == True:
+			print( "response to {}: {}".format( cmd, result ) )
+		future.set_result( result )
+		self.pipeline_window.release()
+
+    # ==================================
+    # __expire_pending() - fails commands
+    # that did not get a response in time
+    # ==================================
+	def __expire_pending(self, force=False ):
+		expired = []
+		with self.pipeline_lock:
+			while len( self.pending_text ) != 0 and ( force or self.pending_text[0][2].expired() ):
+				expired.append( self.pending_text.popleft() )
+			for tag in [ tag for tag, entry in self.pending_bin.items() if force or entry[2].expired() ]:
+				expired.append( self.pending_bin.pop( tag ) )
+
+		for cmd, future, deadline in expired:
+			future.set_exception( TimeoutError( "no response to {}".format( cmd ) ) )
+			self.pipeline_window.release()
+
     # ==================================
     # x()
     # ==================================
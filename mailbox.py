@@ -16,14 +16,15 @@
 SIMULATE_HW         = False #simulate HW by using simulation messageAPI
 SIMULATE_HW_TESTING = False #simulate HW by using simulation messageAPI
                             #but fix include path if running as a test
-DEBUG_PRINTS        = True  #print mailbox debug log
+DEBUG_TRACE         = False #record mailbox traffic into a trace buffer
+                            #(see mailbox_trace.py for formatting)
 
 #---------------------------------------------------------------------
 #                              IMPORTS
 #--------------------------------------------------------------------- 
-import time
+import math
+import threading
 from enum import IntEnum
-import numpy as np
 import struct
 
 # ------------------------------------
@@ -32,16 +33,26 @@ import struct
 # ------------------------------------
 if SIMULATE_HW_TESTING:
     from lib.util.msgAPI_sim import messageAPI
+    from lib.mailbox_trace import mailbox_trace, trace_dir, trace_item, format_events
+    from lib import clock
 elif SIMULATE_HW:
     from util.msgAPI_sim import messageAPI 
+    from mailbox_trace import mailbox_trace, trace_dir, trace_item, format_events
+    import clock
 else:
     from lib.msgAPI import messageAPI
+    from lib.mailbox_trace import mailbox_trace, trace_dir, trace_item, format_events
+    from lib import clock
 
 #---------------------------------------------------------------------
 #                              CONSTANTS
 #--------------------------------------------------------------------- 
 ACK_ID        = 0xFF
 MSG_UPDATE_ID = 0xFE
+MAX_MSG_DATA  = 10   # data bytes per message, larger messages are refused by TXMessage()
+
+# largest finite value of each float format
+FLOAT_MAX     = { 'e': 65504.0, 'f': 3.4028234663852886e+38 }
 
 #---------------------------------------------------------------------
 #                            HELPER CLASSES
@@ -64,17 +75,153 @@ class mailbox_idx(IntEnum):
     DIR  = 3
     SRC  = 4
     DEST = 5
+    TYPE = 6 # optional, inferred from DATA if not provided
+
+# ==================================
+# data_type
+#
+# DESC: on air format of a mailbox
+#       entry. All types are packed
+#       little endian
+# ==================================
+class data_type():
+    def __init__(self, name, fmt, py_type, count = 1, scale = None ):
+        self.name    = name
+        self.fmt     = fmt
+        self.py_type = py_type
+        self.count   = count
+        self.scale   = scale
+        self.codec   = struct.Struct( '<{}{}'.format( count, fmt ) )
+        self.size    = self.codec.size
+
+        # --------------------------------
+        # Valid range for integer formats
+        # (fixed point included) and finite
+        # values of float formats
+        # --------------------------------
+        if fmt in 'bBhHiI':
+            bits = 8 * struct.calcsize( fmt )
+            self.min = -( 1 << ( bits - 1 ) ) if fmt.islower() else 0
+            self.max = ( 1 << ( bits - 1 ) ) - 1 if fmt.islower() else ( 1 << bits ) - 1
+        elif fmt in FLOAT_MAX:
+            self.min = -FLOAT_MAX[ fmt ]
+            self.max = FLOAT_MAX[ fmt ]
+        else:
+            self.min = None
+            self.max = None
+
+    # ==================================
+    # encode() - value -> list of bytes
+    # ==================================
+    def encode( self, value ):
+        values = value if self.count > 1 else [ value ]
+        if self.scale is not None:
+            values = [ round( v * self.scale ) for v in values ]
+
+        return list( self.codec.pack( *values ) )
+
+    # ==================================
+    # decode() - list of bytes -> value
+    # ==================================
+    def decode( self, data ):
+        values = self.codec.unpack( bytes( data[0:self.size] ) )
+        if self.scale is not None:
+            values = [ v / self.scale for v in values ]
+        else:
+            values = [ self.py_type( v ) for v in values ]
+
+        return list( values ) if self.count > 1 else values[0]
+
+    # ==================================
+    # check() - verify value can be sent
+    # ==================================
+    def check( self, value ):
+        if self.count > 1:
+            if type( value ) not in ( list, tuple ) or len( value ) != self.count:
+                return False
+            return all( self.__check_single( v ) for v in value )
+
+        return self.__check_single( value )
+
+    def __check_single( self, value ):
+        # --------------------------------
+        # bools are ints in python, only
+        # allow them for the bool type
+        # --------------------------------
+        if ( type( value ) is bool ) != ( self.py_type is bool ):
+            return False
+
+        if self.scale is not None:
+            if type( value ) not in ( int, float ):
+                return False
+        elif type( value ) is not self.py_type:
+            return False
+
+        # --------------------------------
+        # inf and nan pack fine as floats,
+        # only finite values can overflow a
+        # float format. A fixed point value
+        # must scale to a finite number
+        # --------------------------------
+        if self.fmt in FLOAT_MAX and not math.isfinite( value ):
+            return True
+        if self.scale is not None and not math.isfinite( value * self.scale ):
+            return False
+
+        if self.min is not None:
+            raw = round( value * self.scale ) if self.scale is not None else value
+            return self.min <= raw <= self.max
+
+        return True
+
+# ==================================
+# fixed_type() - scaled integer, e.g.
+# fixed_type( 'i16', 100 ) sends 12.34
+# as 1234 in 2 bytes
+# ==================================
+def fixed_type( base, scale ):
+    base_type = data_types[ base ]
+    return data_type( "{}/{}".format( base, scale ), base_type.fmt, float, scale=scale )
+
+# ==================================
+# array_type() - small fixed size array,
+# e.g. array_type( 'u8', 4 )
+# ==================================
+def array_type( base, count ):
+    base_type = data_types[ base ] if type( base ) is str else base
+    return data_type( "{}[{}]".format( base_type.name, count ), base_type.fmt, base_type.py_type, count=count, scale=base_type.scale )
 
 #---------------------------------------------------------------------
 #                              VARIABLES
 #--------------------------------------------------------------------- 
+# types that can be declared in the TYPE column of a mailbox map
+data_types = {
+    'bool' : data_type( 'bool', '?', bool  ),
+    'u8'   : data_type( 'u8',   'B', int   ),
+    'i8'   : data_type( 'i8',   'b', int   ),
+    'u16'  : data_type( 'u16',  'H', int   ),
+    'i16'  : data_type( 'i16',  'h', int   ),
+    'u32'  : data_type( 'u32',  'I', int   ),
+    'i32'  : data_type( 'i32',  'i', int   ),
+    'f16'  : data_type( 'f16',  'e', float ),
+    'f32'  : data_type( 'f32',  'f', float ),
+}
+
+# types used when TYPE is not declared (legacy maps)
+inferred_types = {
+    bool  : data_types['bool'],
+    int   : data_types['u32'],
+    float : data_types['f32'],
+}
+
 # used for local testing (main() within this file)
 global_mailbox = [
-# data, type,   flag,  dir,  src,                    dest
+# data, rate,   flag,  dir,  src,                 dest,                 type (optional)
 [ 0,   'ASYNC', False, 'RX', modules.RPI_MODULE,  modules.PICO_MODULE ],
 [ 0.0, '1',     False, 'TX', modules.PICO_MODULE, modules.RPI_MODULE  ],
 [ 0,   '5',     False, 'TX', modules.RPI_MODULE,  modules.PICO_MODULE ], 
 [ 0.0, '5',     False, 'TX', modules.RPI_MODULE,  modules.PICO_MODULE ],
+[ 0,   '5',     False, 'TX', modules.RPI_MODULE,  modules.PICO_MODULE, 'u8' ],
  ]
 
 #---------------------------------------------------------------------
@@ -85,25 +232,53 @@ class Mailbox():
     # ==================================
     # constructor() 
     # ==================================	
-    def __init__(self, msg_conn, gbl_mailbox, manage_lst = None ):
+    def __init__(self, msg_conn, gbl_mailbox, manage_lst = None, thread_safe = False, trace = None ):
         self.msg_conn          = msg_conn
         self.mailbox_map       = gbl_mailbox
 
-        self.round_counter     = 0 # round counter always starts at 0 
+        # ------------------------------------
+        # Resolve the on air type of each entry
+        # once, either declared or inferred
+        # ------------------------------------
+        self.type_map          = [ self.__resolve_type( entry ) for entry in self.mailbox_map ]
+        self.encoded_cache     = {} # idx -> [ idx, data bytes ], dropped on any write
+
+        # ------------------------------------
+        # Trace buffer is None when disabled so
+        # the hot path only pays for one check
+        # ------------------------------------
+        self.trace             = mailbox_trace( time_source=clock.now ) if ( trace is None and DEBUG_TRACE ) else trace
+
         self.ack_list          = []
         self.expecting_ack_map = {}
         self.current_round     = 0
         self.tx_queue          = []
 
+        # ------------------------------------
+        # Thread safe mode. Writers place new
+        # data into pending_writes (under the
+        # write lock) and the runtime drains it
+        # once per cycle. Readers never lock,
+        # they read the last published snapshot
+        # ------------------------------------
+        self.thread_safe       = thread_safe
+        self.write_lock        = threading.Lock()
+        self.pending_writes    = {}
+        self.snapshot          = ( 0, tuple( entry[mailbox_idx.DATA] for entry in self.mailbox_map ) )
+        self.runtime_thread    = None
+        self.runtime_stop      = threading.Event()
+
 		# ------------------------------------
 		# By default we only manage the
         # current module (ourself). However for
         # testing we can manage multiple modules
+        # (emulating several nodes sharing one
+        # radio or a loopback transport)
 		# ------------------------------------
-        self.manage_list = [ msg_conn.currentModule ] if manage_lst is None else manage_lst
-        if manage_lst != None:
-            # we need to make changes to msgAPI to provide destination data before we can implement here
-            raise( NotImplementedError )
+        self.manage_list = [ msg_conn.currentModule ] if manage_lst is None else list( manage_lst )
+
+        # round counter always starts at 0, one per managed module
+        self.round_counter = { module: 0 for module in self.manage_list }
 
 	# ==================================
     # mailbox_runtime() 
@@ -113,19 +288,66 @@ class Mailbox():
 		# Call Rx and Tx Functions
 		# ------------------------------------
         self.rx_runtime()
-        time.sleep(.5)
+        clock.sleep(.5)
         self.tx_runtime()
 
+	# ==================================
+    # start_thread()
+    #
+    # DESC: runs runtime() in a dedicated
+    #       background thread. Requires
+    #       thread_safe mode
+    # ==================================
+    def start_thread( self, period = 0 ):
+        if not self.thread_safe:
+            raise( RuntimeError( "mailbox must be created with thread_safe=True to run in a thread" ) )
+
+        if self.runtime_thread is not None:
+            return
+
+        self.runtime_stop.clear()
+        self.runtime_thread = threading.Thread( target=self.__thread_loop, args=( period, ), daemon=True )
+        self.runtime_thread.start()
+
+	# ==================================
+    # stop_thread()
+    # ==================================
+    def stop_thread( self ):
+        if self.runtime_thread is None:
+            return
+
+        self.runtime_stop.set()
+        self.runtime_thread.join()
+        self.runtime_thread = None
+
+	# ==================================
+    # __thread_loop()
+    # ==================================
+    def __thread_loop( self, period ):
+        while not self.runtime_stop.is_set():
+            self.runtime()
+            self.runtime_stop.wait( period )
+
 
 	# ==================================
     # rx_runtime() 
     # ==================================	
     def rx_runtime( self ):
+		# ------------------------------------
+		# Apply any writes made from other
+        # threads since the last cycle
+		# ------------------------------------
+        if self.thread_safe:
+            self.__drain_writes()
+
 		# ------------------------------------
 		# Determine if we have any new messages
         # and exit if not
 		# ------------------------------------
-        rtn_data = self.msg_conn.RX_Multi()
+        if len( self.manage_list ) == 1:
+            rtn_data = self.msg_conn.RX_Multi()
+        else:
+            rtn_data = self.msg_conn.RX_Multi( dest_list=self.manage_list )
         if( rtn_data == None ):
             return
         
@@ -139,7 +361,15 @@ class Mailbox():
 		# ------------------------------------
         if num_rx != 0:
             for msg in data_rx:
-                rx_src, rx_data, rx_validity = msg
+                rx_src, rx_data, rx_validity = msg[0:3]
+
+                # -----------------------------
+                # Ignore our own transmissions
+                # when managing several modules
+                # over a shared/loopback link
+                # -----------------------------
+                if len( self.manage_list ) > 1 and rx_src in self.manage_list:
+                    continue
 
                 # -----------------------------
                 # Do not handle if validity is
@@ -147,28 +377,64 @@ class Mailbox():
                 # -----------------------------
                 if rx_validity != True:
                     print("Invalid msg Rx'ed: src/{} data/{} valid/{}".format(rx_src, rx_data, rx_validity))
+                    if self.trace is not None:
+                        self.trace.record( trace_dir.RX, trace_item.INVALID, rx_src, rx_data )
                     continue
 
                 # -----------------------------
                 # Parse raw MsgAPI
                 # -----------------------------
-                self.debug_prints(dir='RX', data=rx_data)
                 self.__parse_rx( rx_data )
 
+            # ---------------------------------
+            # Publish RX'ed data for readers
+            # ---------------------------------
+            if self.thread_safe:
+                self.__publish_snapshot()
+            else:
+                self.__bump_version()
+
 	# ==================================
     # tx_runtime() 
     # ==================================
     def tx_runtime( self ):
+		# ------------------------------------
+		# Apply any writes made from other
+        # threads since the last cycle, even
+        # when it is not our turn, so readers
+        # see them straight away
+		# ------------------------------------
+        if self.thread_safe:
+            self.__drain_writes()
+
 		# ------------------------------------
 		# Exit if it is not our turn to transmit
 		# ------------------------------------
-        if self.current_round != self.msg_conn.currentModule:
+        if self.current_round not in self.manage_list:
             return
-        
+
+		# ------------------------------------
+		# Transmit for each managed module
+        # whose turn it is. The round update
+        # sent by one module hands the turn
+        # to the next, so if that module is
+        # also managed it transmits right away
+		# ------------------------------------
+        for _ in range( len( self.msg_conn.listOfModules ) ):
+            if self.current_round not in self.manage_list:
+                break
+            self.__tx_module( self.current_round )
+
+	# ==================================
+    # __tx_module()
+    # ==================================
+    def __tx_module( self, module ):
 		# ------------------------------------
 		# Verify Acks
 		# ------------------------------------
         for idx in self.expecting_ack_map:
+            if self.mailbox_map[idx][mailbox_idx.SRC] != module:
+                continue
             # ---------------------------------
             # If missing an ACK, report error &
             # clear for next round
@@ -176,6 +442,8 @@ class Mailbox():
             # ---------------------------------
             if self.expecting_ack_map[idx] == True:
                 print("Missing ACK for idx {}".format( idx ) )
+                if self.trace is not None:
+                    self.trace.record( trace_dir.TX, trace_item.MISSING_ACK, idx, [] )
                 self.tx_queue.append( ['data', idx] ) #add data to queue (this may result in a double send). Ideally we should switch from tx_queue to tx_map or something
                 self.expecting_ack_map[ idx ] = False
 
@@ -183,15 +451,23 @@ class Mailbox():
 		# Loop through each entry in map and
         # handle any that need handling
 		# ------------------------------------
-        for idx, [data, rate, flag, dir, src, dest] in enumerate(self.mailbox_map):
-            if( src == self.msg_conn.currentModule ):
+        for idx, [data, rate, flag, dir, src, dest] in enumerate( entry[0:6] for entry in self.mailbox_map ):
+            if( src == module ):
                 # ----------------------------
                 # Only handle if:
                 # 1) ASYNC and flagged 
                 # *OR*
                 # 2) Round % cntr == 0 
                 # -----------------------------
-                if ( rate == 'ASYNC' and flag == True ) or ( rate != 'ASYNC' and ( self.round_counter % int(rate) == 0) ):
+                if ( rate == 'ASYNC' and flag == True ) or ( rate != 'ASYNC' and ( self.round_counter[module] % int(rate) == 0) ):
+                    # ------------------------
+                    # If the destination is also
+                    # managed here it already
+                    # shares this mailbox map,
+                    # nothing to send or ack
+                    # ------------------------
+                    if dest in self.manage_list:
+                        continue
                     self.tx_queue.append( ['data', idx] )
                     self.expecting_ack_map[ idx ] = True
 
@@ -203,8 +479,7 @@ class Mailbox():
 		# ------------------------------------
 		# Pack and send Tx queue
 		# ------------------------------------
-        self.debug_prints(dir='TX',data=[])
-        self.__msg_interface_pack_and_send()
+        self.__msg_interface_pack_and_send( module )
 
 		# ------------------------------------
 		# Update round counter
@@ -213,35 +488,41 @@ class Mailbox():
         # round, this is used to associate TX
         # rate by rate of tx_runtime()
 		# ------------------------------------
-        self.round_counter = (self.round_counter + 1) % 100
+        self.round_counter[module] = (self.round_counter[module] + 1) % 100
 
 	# ==================================
     # __msg_interface_pack_and_send() 
     # ==================================	
-    def __msg_interface_pack_and_send( self ):
+    def __msg_interface_pack_and_send( self, module ):
 		# ------------------------------------
 		# setup local variables
 		# ------------------------------------
         msg_data = []
         msg_dest = None
+        remaining_queue = []
 
 		# ------------------------------------
 		# Loop through TX queue
 		# ------------------------------------
         for data_type, data_idx in self.tx_queue:
+            # ----------------------------
+            # Items owned by another managed
+            # module wait for its turn
+            # ----------------------------
+            if data_type != 'round' and self.__tx_owner( data_type, data_idx ) != module:
+                remaining_queue.append( [ data_type, data_idx ] )
+                continue
+
             # ----------------------------
             # Data Type
             # ----------------------------
             if data_type == 'data':
-                data_var, rate, flag, dir, src, dest = self.mailbox_map[data_idx]
-                data_size = 1 if type(data_var) is bool else 4
-                data_dest = dest
+                data_var  = self.mailbox_map[data_idx][mailbox_idx.DATA]
+                data_dest = self.mailbox_map[data_idx][mailbox_idx.DEST]
 
                 # ------------------------
-                # Because u32, flt and bool
-                # are formatted differently
-                # in binary, we need to
-                # handle formatting
+                # Format data based upon its
+                # declared (or inferred) type
                 # ------------------------
                 data_formated = self.__data_type_handler( data_var, data_idx )
 
@@ -249,9 +530,7 @@ class Mailbox():
             # Ack Type
             # ----------------------------
             if data_type == 'ack':
-                data_var, rate, flag, dir, src, dest = self.mailbox_map[data_idx]
-                data_size = 1
-                data_dest = src
+                data_dest = self.mailbox_map[data_idx][mailbox_idx.SRC]
 
                 data_formated = [ACK_ID, data_idx]
 
@@ -259,8 +538,7 @@ class Mailbox():
             # Round Update Type
             # ----------------------------
             if data_type == 'round':
-                data_size = 1
-                data_dest = modules.MODULE_ALL
+                data_dest = self.msg_conn.module_all
                 # ------------------------
                 # Updates the current round
                 # and handles rollover
@@ -277,7 +555,7 @@ class Mailbox():
             if msg_dest == None:
                 msg_dest = data_dest
             elif msg_dest != data_dest:
-                msg_dest = modules.MODULE_ALL
+                msg_dest = self.msg_conn.module_all
 
             # --------------------------------
             # Determine if new data can fit
@@ -285,22 +563,24 @@ class Mailbox():
             # current message and begin building
             # new message
             # --------------------------------
-            if (len(msg_data) + len(data_formated) ) > 10:
+            if (len(msg_data) + len(data_formated) ) > MAX_MSG_DATA:
                 # ----------------------------
                 # Tx and update msg_data & 
                 # msg_dest w/ new params
                 # ----------------------------
-                self.msg_conn.TXMessage( msg_data, msg_dest )
+                self.__tx_message( msg_data, msg_dest, module )
 
                 msg_data = []
                 msg_dest = data_dest
             
+            if self.trace is not None:
+                self.__trace_tx( data_type, data_idx, data_formated )
+
             # --------------------------------
             # Add formatted data to end of 
             # msg_data
             # --------------------------------
-            for data_bytes in data_formated:
-                msg_data.append( data_bytes )
+            msg_data.extend( data_formated )
 
 
 		# ------------------------------------
@@ -308,43 +588,121 @@ class Mailbox():
         # a half full message upon exit.
 		# ------------------------------------
         if len(msg_data) > 0:
-            self.msg_conn.TXMessage( msg_data, msg_dest )
+            self.__tx_message( msg_data, msg_dest, module )
 
 		# ------------------------------------
-		# Empty queue for next run
+		# Keep only what is still waiting on
+        # another managed module
 		# ------------------------------------
-        self.tx_queue = []
+        self.tx_queue = remaining_queue
+
+	# ==================================
+    # __tx_owner()
+    #
+    # DESC: returns the managed module that
+    #       transmits a tx queue item
+    # ==================================
+    def __tx_owner( self, data_type, data_idx ):
+        if len( self.manage_list ) == 1:
+            return self.manage_list[0]
+
+        if data_type == 'data':
+            return self.mailbox_map[data_idx][mailbox_idx.SRC]
+
+        # ack's are sent by the receiving module
+        dest = self.mailbox_map[data_idx][mailbox_idx.DEST]
+        return dest if dest in self.manage_list else self.manage_list[0]
+
+	# ==================================
+    # __tx_message()
+    # ==================================
+    def __tx_message( self, msg_data, msg_dest, module ):
+        # --------------------------------
+        # Only provide the source when we
+        # are transmitting on behalf of
+        # another module
+        # --------------------------------
+        if module == self.msg_conn.currentModule:
+            self.msg_conn.TXMessage( msg_data, msg_dest )
+        else:
+            self.msg_conn.TXMessage( msg_data, msg_dest, source=module )
+
+	# ==================================
+    # __trace_tx()
+    # ==================================
+    def __trace_tx( self, data_type, data_idx, data_formated ):
+        if data_type == 'data':
+            self.trace.record( trace_dir.TX, trace_item.DATA, data_idx, data_formated )
+        elif data_type == 'ack':
+            self.trace.record( trace_dir.TX, trace_item.ACK, data_idx, data_formated )
+        else:
+            self.trace.record( trace_dir.TX, trace_item.ROUND, data_formated[1], data_formated )
 
 	# ==================================
     # __data_type_handler()
     #
-    # DESC: formats int32, float32, and
-    #       bools into uint8 list
+    # DESC: formats data into uint8 list
+    #       (idx byte + data bytes) using
+    #       the entry's data type
     # ==================================	
     def __data_type_handler( self, data, idx ):
         # --------------------------------
-        # integer
+        # Reuse the encoded bytes if the
+        # value has not changed since they
+        # were built
+        # --------------------------------
+        encoded = self.encoded_cache.get( idx )
+        if encoded is None:
+            encoded = [ idx ] + self.type_map[ idx ].encode( data )
+            self.encoded_cache[ idx ] = encoded
+
+        return encoded
+
+	# ==================================
+    # invalidate()
+    #
+    # DESC: drops the cached encoding of an
+    #       entry. Only needed if mailbox_map
+    #       is written directly instead of
+    #       through set_data()
+    # ==================================
+    def invalidate( self, idx ):
+        self.encoded_cache.pop( idx, None )
+
+	# ==================================
+    # __resolve_type()
+    # ==================================
+    def __resolve_type( self, entry ):
+        # --------------------------------
+        # Declared type (name or data_type)
         # --------------------------------
-        if type(data) == type(int()):
-            temp_arr =  [ idx, (data >> 24 ), ((data >> 16) & 0x000000FF), ((data >> 8) & 0x000000FF), (data & 0x000000FF)]
-            #fix direction packing
-            return [ idx, temp_arr[4], temp_arr[3], temp_arr[2], temp_arr[1] ]
+        if len( entry ) > mailbox_idx.TYPE:
+            declared = entry[ mailbox_idx.TYPE ]
+            if isinstance( declared, data_type ):
+                entry_type = declared
+            elif declared in data_types:
+                entry_type = data_types[ declared ]
+            else:
+                raise( ValueError( "unknown mailbox data type: {}".format( declared ) ) )
+
         # --------------------------------
-        # bool
+        # Legacy map, infer from the value
         # --------------------------------
-        if type(data) == type(bool()):
-            return [ idx, int(data) ]
+        elif type( entry[ mailbox_idx.DATA ] ) in inferred_types:
+            entry_type = inferred_types[ type( entry[ mailbox_idx.DATA ] ) ]
+        else:
+            raise( ValueError( "cannot infer mailbox data type of: {}".format( entry[ mailbox_idx.DATA ] ) ) )
+
         # --------------------------------
-        # float
+        # The entry (idx byte + data) must
+        # fit in one message and its initial
+        # value must be sendable
         # --------------------------------
-        if type(data) == type(float()):
-            temp_data = np.float32(data)
-            hex_str = hex(struct.unpack('<I', struct.pack('<f', temp_data))[0])
-            int_representation = int( hex_str, 16 )
-            
-            temp_arr = [ idx, (int_representation >> 24 ), ((int_representation >> 16) & 0x000000FF), ((int_representation >> 8) & 0x000000FF), (int_representation & 0x000000FF)]
-            #fix direction packing
-            return [ idx, temp_arr[4], temp_arr[3], temp_arr[2], temp_arr[1] ]
+        if entry_type.size + 1 > MAX_MSG_DATA:
+            raise( ValueError( "mailbox data type {} is {} bytes, only {} fit in a message".format( entry_type.name, entry_type.size, MAX_MSG_DATA - 1 ) ) )
+        if not entry_type.check( entry[ mailbox_idx.DATA ] ):
+            raise( ValueError( "initial value {} does not match mailbox data type {}".format( entry[ mailbox_idx.DATA ], entry_type.name ) ) )
+        return entry_type
 
 	# ==================================
     # __round_update() 
@@ -382,6 +740,8 @@ class Mailbox():
             if data_type == special_response.ACK_ID:
                 idx = idx + 1
                 self.expecting_ack_map[ rx_data[idx] ] = False
+                if self.trace is not None:
+                    self.trace.record( trace_dir.RX, trace_item.ACK, rx_data[idx], rx_data[idx-1:idx+1] )
                 idx = idx+1 # place index for next data
             # ----------------------------
             # UPDATE Handling. We dont have
@@ -392,6 +752,8 @@ class Mailbox():
             elif data_type == special_response.MSG_UPDATE_ID:
                 idx = idx + 1 
                 new_rnd = rx_data[idx]
+                if self.trace is not None:
+                    self.trace.record( trace_dir.RX, trace_item.ROUND, new_rnd, rx_data[idx-1:idx+1] )
                 self.__round_update()
 
                 if new_rnd != self.current_round:
@@ -403,7 +765,10 @@ class Mailbox():
             # DATA/Default Handling
             # ----------------------------
             else:
-                idx = idx + self.__data_rx_handler( rx_data[idx+1:], data_type )
+                data_size = self.__data_rx_handler( rx_data[idx+1:], data_type )
+                if self.trace is not None:
+                    self.trace.record( trace_dir.RX, trace_item.DATA, data_type, rx_data[idx:idx+data_size] )
+                idx = idx + data_size
                 self.tx_queue.append( [ 'ack', data_type ] ) 
 
 	# ==================================
@@ -411,179 +776,117 @@ class Mailbox():
     # ==================================	
     def __data_rx_handler( self, data, idx ):
 		# ------------------------------------
-		# Aquire variables from mailbox map
-		# ------------------------------------
-        data_var, rate, flag, dir, src, dest = self.mailbox_map[ idx ]
-
-		# ------------------------------------
-		# Set flag to True for data RX
+		# Aquire data type of the entry
 		# ------------------------------------
-        flag = True
+        if idx >= len( self.type_map ):
+            raise( ValueError( "Rx'ed data for unknown idx {}, have we currupted our mailbox map?".format( idx ) ) )
+        entry_type = self.type_map[ idx ]
 
         # --------------------------------
-        # INT -- 4 bytes + idx byte = 5
-        # --------------------------------
-        if type(data_var) == type(int()):
-            data = data[0:4]
-            data.reverse() #cannot call this here bc array is [idx:->end]
-            self.mailbox_map[ idx ][mailbox_idx.DATA] = int( (data[0] << 24 ) | (data[1] << 16) | (data[2] << 8) | data[3] )
-            return 5 # msg size
-        
-        # --------------------------------
-        # BOOL -- 1 byte + idx byte = 2
+        # Decode. All processors in the
+        # chain are little endian, as is
+        # the packing used by data_type
         # --------------------------------
-        if type(data_var) == type(bool()):
-            self.mailbox_map[ idx ][mailbox_idx.DATA] = bool( data[0] )
-            return 2 # msg size
-        
-        # --------------------------------
-        # FLOAT -- 4 bytes + idx byte = 5
-        #
-        # This logic works due to all 
-        # processors in the chain being
-        # little endian. This would need
-        # to be reworked if one isn't
-        # --------------------------------
-        if type(data_var) == type(float()):
-            data = data[0:4]
-
-            #3B+ + pico + masOS are little endian so no need to reverse
-            raw_unit8_data = np.array(data[0:4], dtype='uint8')
-
-            rtn = raw_unit8_data.view('<f4') #cast into float32
-            self.mailbox_map[ idx ][mailbox_idx.DATA] = float(rtn[0])
-            return 5 # msg size
-        
-        raise( "Data type is not supported, have we currupted our mailbox map?" )
+        self.mailbox_map[ idx ][mailbox_idx.DATA] = entry_type.decode( data )
+        self.encoded_cache.pop( idx, None )
+        return entry_type.size + 1 # msg size (data + idx byte)
 
     def set_data( self, data, idx ):
         if self.mailbox_map[idx][mailbox_idx.SRC] not in self.manage_list:
             raise( "attempting to set incorrect index")
             return False
 
-        if type(self.mailbox_map[idx][mailbox_idx.DATA]) != type( data ):
-            raise( "attempting to set incorrect data type")
+        if not self.type_map[idx].check( data ):
+            raise( ValueError( "attempting to set incorrect data type for {}: {}".format( self.type_map[idx].name, data ) ) )
             return False
+
+        # ------------------------------------
+        # In thread safe mode the write is
+        # queued and applied by the runtime
+        # ------------------------------------
+        if self.thread_safe:
+            with self.write_lock:
+                self.pending_writes[ idx ] = data
+            return True
         
         self.mailbox_map[idx][mailbox_idx.DATA] = data
         self.mailbox_map[idx][mailbox_idx.FLAG] = True
+        self.encoded_cache.pop( idx, None )
+        self.__bump_version()
         return True
-    
-
-    def debug_prints( self, dir, data ):
-        dir_text = "Sending" if dir == 'TX' else "Receiving"
-        print( "{}: ".format(dir_text), end="")
-
-        # ----------------------------------------
-        # Rough copy of __parse_rx()
-        # ----------------------------------------
-        if dir == 'RX':
-            # ------------------------------------
-            # setup variables
-            # ------------------------------------
-            idx = 0
-            # ------------------------------------
-            # Loop through each index in rx_data
-            # ------------------------------------
-            while idx < len( data):
-                # --------------------------------
-                # aquire first byte and switch 
-                # based upon if it is an ACK, DATA,
-                # or ROUND update
-                # --------------------------------
-                data_type = data[idx]
 
-                # ----------------------------
-                # ACK Handling
-                # ----------------------------
-                if data_type == special_response.ACK_ID:
-                    idx = idx + 1 #go to next byte 
-                    print( "[ACK] - {} | ".format( hex(data[idx])), end="" )
-                    self.expecting_ack_map[ data[idx] ] = False
+	# ==================================
+    # get_data()
+    #
+    # DESC: in thread safe mode returns the
+    #       value from the last published
+    #       snapshot without locking
+    # ==================================
+    def get_data( self, idx ):
+        if self.thread_safe:
+            return self.snapshot[1][ idx ]
 
-                    idx = idx+1 # place index for next data
-                # ----------------------------
-                # UPDATE Handling. We dont have
-                # to worry about a self update
-                # w/ dest ALL because we cannot
-                # TX and RX at the same time
-                # ----------------------------
-                elif data_type == special_response.MSG_UPDATE_ID:
-                    idx = idx + 1 
-                    new_rnd = data[idx]
-                    print( "[RND] - {} | ".format( hex(new_rnd)), end="" )
+        return self.mailbox_map[idx][mailbox_idx.DATA]
 
-                    idx = idx+1 #place index for next data
-                # ----------------------------
-                # DATA/Default Handling
-                # ----------------------------
-                else:
-                    data_sz = ( 1 if type( self.mailbox_map[data_type][mailbox_idx.DATA]) is bool else 4 )
-                    print( "[DATA - {}] - ".format( hex(data_type)), end="" )
-                    idx = idx + 1
-                    for i in range( data_sz):
-                        print( "{} ".format( hex( data[idx]) ), end="" )
-                        idx = idx + 1
-
-                    print("| ", end="")
-
-
-        # ----------------------------------------
-        # Rough copy of __pack_tx()
-        # ----------------------------------------
-        if dir == 'TX':
-            # ------------------------------------
-            # setup local variables
-            # ------------------------------------
-            msg_data = []
-            msg_dest = None
-
-            # ------------------------------------
-            # Loop through TX queue
-            # ------------------------------------
-            for data_type, data_idx in self.tx_queue:
-                # ----------------------------
-                # Data Type
-                # ----------------------------
-                if data_type == 'data':
-                    data_var, rate, flag, dir, src, dest = self.mailbox_map[data_idx]
+	# ==================================
+    # get_snapshot()
+    #
+    # DESC: returns ( version, data tuple ).
+    #       The tuple is immutable and is
+    #       replaced (never modified) by the
+    #       runtime, so it is always consistent.
+    #       The version goes up on every
+    #       set_data() and Rx in either mode
+    # ==================================
+    def get_snapshot( self ):
+        if self.thread_safe:
+            return self.snapshot
 
-                    # ------------------------
-                    # Because u32, flt and bool
-                    # are formatted differently
-                    # in binary, we need to
-                    # handle formatting
-                    # ------------------------
-                    data_formated = self.__data_type_handler( data_var, data_idx )
-                    print( "[DATA - {}] - ".format( hex(data_idx)), end="" )
-                    for d in data_formated:
-                        print( "{} ".format( hex(d)), end="")
-                    print("| ", end="")
-                # ----------------------------
-                # Ack Type
-                # ----------------------------
-                if data_type == 'ack':
-                    data_var, rate, flag, dir, src, dest = self.mailbox_map[data_idx]
-                    data_size = 1
-                    data_dest = src
+        return ( self.snapshot[0], tuple( entry[mailbox_idx.DATA] for entry in self.mailbox_map ) )
 
-                    data_formated = [ACK_ID, data_idx]
-                    print( "[ACK - {}] - ".format( hex(data_idx)), end="" )
-                    for d in data_formated:
-                        print( "{} ".format( hex(d)), end="")
-                    print("| ", end="")
+	# ==================================
+    # __drain_writes()
+    # ==================================
+    def __drain_writes( self ):
+        # --------------------------------
+        # Swap out pending writes under the
+        # lock, then apply them lock free
+        # --------------------------------
+        with self.write_lock:
+            writes = self.pending_writes
+            self.pending_writes = {}
 
-                # ----------------------------
-                # Round Update Type
-                # ----------------------------
-                if data_type == 'round':
-                    data_formated = [ MSG_UPDATE_ID, self.current_round ]
-                    print( "[RND] - ", end="" )
-                    for d in data_formated:
-                        print( "{} ".format( hex(d)), end="")
-                    print("| ", end="")
-   
-        print("") #add \n
+        if len( writes ) == 0:
+            return
+
+        for idx, data in writes.items():
+            self.mailbox_map[idx][mailbox_idx.DATA] = data
+            self.mailbox_map[idx][mailbox_idx.FLAG] = True
+            self.encoded_cache.pop( idx, None )
+
+        self.__publish_snapshot()
+
+	# ==================================
+    # __bump_version()
+    #
+    # DESC: non thread safe mode builds the
+    #       data tuple on demand, only the
+    #       version is kept in the snapshot
+    # ==================================
+    def __bump_version( self ):
+        self.snapshot = ( self.snapshot[0] + 1, self.snapshot[1] )
+
+	# ==================================
+    # __publish_snapshot()
+    # ==================================
+    def __publish_snapshot( self ):
+        # --------------------------------
+        # A single attribute assignment is
+        # atomic, readers see either the old
+        # or the new snapshot, never a mix
+        # --------------------------------
+        data = tuple( entry[mailbox_idx.DATA] for entry in self.mailbox_map )
+        self.snapshot = ( self.snapshot[0] + 1, data )
 
 #---------------------------------------------------------------------
 #                               MAIN
@@ -600,9 +903,15 @@ def main():
 
     while( True ):
         #run every 10ms
-        time.sleep(2)    
+        clock.sleep(2)    
         mailbox.runtime()
 
+        #print trace for this cycle
+        if mailbox.trace is not None:
+            for line in format_events( mailbox.trace.events() ):
+                print( line )
+            mailbox.trace.clear()
+
         #realtime debug help
         # mailbox.current_round = 0 
 
@@ -0,0 +1,190 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       mailbox_trace.py - mailboxAPI trace buffer
+#
+#   DESCRIPTION:
+#       Records mailbox traffic as compact binary events into a
+#       preallocated ring buffer. Events are formatted offline, either
+#       from a live buffer or from a dumped trace file:
+#
+#           python mailbox_trace.py mailbox_trace.bin
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import struct
+import sys
+import time
+from enum import IntEnum
+
+#---------------------------------------------------------------------
+#                              CONSTANTS
+#---------------------------------------------------------------------
+TRACE_MAGIC      = b'MBXT'
+TRACE_VERSION    = 1
+TRACE_MAX_BYTES  = 10    # max payload stored per event (one msgAPI frame)
+TRACE_DEFAULT_SZ = 4096  # number of events held before wrapping
+
+# Event record: timestamp, dir, item, idx, num bytes, bytes
+TRACE_RECORD = struct.Struct( '<dBBBB{}s'.format( TRACE_MAX_BYTES ) )
+TRACE_HEADER = struct.Struct( '<4sBHI' )
+
+#---------------------------------------------------------------------
+#                            HELPER CLASSES
+#---------------------------------------------------------------------
+class trace_dir(IntEnum):
+    RX = 0
+    TX = 1
+
+class trace_item(IntEnum):
+    DATA        = 0
+    ACK         = 1
+    ROUND       = 2
+    INVALID     = 3
+    MISSING_ACK = 4
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class mailbox_trace():
+    # ==================================
+    # constructor()
+    # ==================================
+    def __init__(self, size = TRACE_DEFAULT_SZ, time_source = time.perf_counter ):
+        self.size        = size
+        self.buffer      = bytearray( size * TRACE_RECORD.size )
+        self.count       = 0 # total events recorded (including overwritten)
+        self.time_source = time_source
+
+    # ==================================
+    # record()
+    #
+    # DESC: stores one event, overwriting
+    #       the oldest when full. No
+    #       allocation besides the bytes()
+    #       copy of the payload
+    # ==================================
+    def record( self, dir, item, idx, data ):
+        num_bytes = min( len(data), TRACE_MAX_BYTES )
+        offset    = ( self.count % self.size ) * TRACE_RECORD.size
+
+        TRACE_RECORD.pack_into( self.buffer, offset, self.time_source(), dir, item, idx, num_bytes, bytes( data[:num_bytes] ) )
+        self.count = self.count + 1
+
+    # ==================================
+    # events()
+    #
+    # DESC: returns recorded events, oldest
+    #       first, as ( time, dir, item, idx,
+    #       [bytes] )
+    # ==================================
+    def events( self ):
+        return unpack_events( self.__ordered_records(), min( self.count, self.size ) )
+
+    # ==================================
+    # clear()
+    # ==================================
+    def clear( self ):
+        self.count = 0
+
+    # ==================================
+    # dump()
+    #
+    # DESC: writes the buffer to a file for
+    #       offline formatting
+    # ==================================
+    def dump( self, file_path ):
+        num_events = min( self.count, self.size )
+
+        with open( file_path, "wb" ) as f:
+            f.write( TRACE_HEADER.pack( TRACE_MAGIC, TRACE_VERSION, TRACE_RECORD.size, num_events ) )
+            f.write( self.__ordered_records() )
+
+    # ==================================
+    # __ordered_records()
+    # ==================================
+    def __ordered_records( self ):
+        if self.count <= self.size:
+            return bytes( self.buffer[ : self.count * TRACE_RECORD.size ] )
+
+        # --------------------------------
+        # Buffer has wrapped, oldest event
+        # sits at the next write position
+        # --------------------------------
+        split = ( self.count % self.size ) * TRACE_RECORD.size
+        return bytes( self.buffer[split:] + self.buffer[:split] )
+
+#---------------------------------------------------------------------
+#                              FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# unpack_events()
+# ==================================
+def unpack_events( raw, num_events ):
+    events = []
+    for i in range( num_events ):
+        timestamp, dir, item, idx, num_bytes, data = TRACE_RECORD.unpack_from( raw, i * TRACE_RECORD.size )
+        events.append( ( timestamp, dir, item, idx, list( data[:num_bytes] ) ) )
+
+    return events
+
+# ==================================
+# load_trace()
+# ==================================
+def load_trace( file_path ):
+    with open( file_path, "rb" ) as f:
+        raw = f.read()
+
+    magic, version, record_size, num_events = TRACE_HEADER.unpack_from( raw, 0 )
+    if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != TRACE_RECORD.size:
+        raise( ValueError( "{} is not a supported mailbox trace".format( file_path ) ) )
+
+    return unpack_events( raw[TRACE_HEADER.size:], num_events )
+
+# ==================================
+# format_events()
+# ==================================
+def format_events( events ):
+    lines = []
+    if len( events ) == 0:
+        return lines
+
+    start_time = events[0][0]
+    for timestamp, dir, item, idx, data in events:
+        dir_text = "Sending" if dir == trace_dir.TX else "Receiving"
+
+        if item == trace_item.DATA:
+            item_text = "[DATA - {}]".format( hex(idx) )
+        elif item == trace_item.ACK:
+            item_text = "[ACK - {}]".format( hex(idx) )
+        elif item == trace_item.ROUND:
+            item_text = "[RND]"
+        elif item == trace_item.MISSING_ACK:
+            item_text = "[MISSING ACK - {}]".format( hex(idx) )
+        else:
+            item_text = "[INVALID - src {}]".format( hex(idx) )
+
+        lines.append( "{:12.6f} {:>9}: {} - {}".format( timestamp - start_time, dir_text, item_text, " ".join( hex(d) for d in data ) ) )
+
+    return lines
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    if len( sys.argv ) != 2:
+        print( "usage: python mailbox_trace.py <trace file>" )
+        return
+
+    for line in format_events( load_trace( sys.argv[1] ) ):
+        print( line )
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
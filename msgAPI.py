@@ -20,7 +20,7 @@ DEBUG_PRINTS = False
 if( PC_TESTING ):
 	from lib.lora_over_serial import lora_serial
 else:
-	import spidev
+	from lib import hw
 import time
 
 
@@ -47,6 +47,13 @@ crc8_table = [
 
 LORA_FIFO_SIZE = 0x80 
 
+#registers set by __LoraInit() as [ reg, mask, value ], used by CheckInit()
+LORA_INIT_CHECK = [
+	[ 0x01, 0x80, 0x80 ], #LoRa mode (any sub mode)
+	[ 0x09, 0xFF, 0xFF ], #PA config
+	[ 0x40, 0xFF, 0x00 ], #DIO mapping
+]
+
 #---------------------------------------------------------------------
 #                              CLASSES
 #---------------------------------------------------------------------
@@ -68,7 +75,7 @@ class messageAPI:
 			self.lora_serr_conn = lora_serial()
 		else:
 			# Enable SPI
-			self.spi = spidev.SpiDev()
+			self.spi = hw.get_spi()
 			self.spi.open(bus, chip_select)
 			self.spi.max_speed_hz = 100000
 			self.spi.mode = 0
@@ -80,10 +87,24 @@ class messageAPI:
 		self.__LoraInit()
 		self.__LoraSetRxMode()
 
+    # ==================================
+    # CheckInit(): True if the radio still
+	# holds the config InitAPI() sets
+    # ==================================
+	def CheckInit(self):
+		if( PC_TESTING ):
+			return True
+
+		for reg, mask, value in LORA_INIT_CHECK:
+			result = self.spi.xfer2( [0x00 | reg, 0x00] )
+			if( result[1] & mask != value ):
+				return False
+		return True
+
     # ==================================
     # TXMessage()
     # ==================================
-	def TXMessage(self, message, destination):
+	def TXMessage(self, message, destination, source=None):
 		#Verify variables
 		message_size = len(message)
 		if( message_size > 10):
@@ -104,7 +125,7 @@ class messageAPI:
 		# Byte 5 -- start of data region
 		# Byte X -- crc (last byte)
 		message.insert(0, destination)
-		message.insert(1, self.currentModule)
+		message.insert(1, self.currentModule if source is None else source)
 		message.insert(2, 0x00 )
 		message.insert(3, version_size_var )
 		message.insert(4, self.curr_key )
@@ -174,7 +195,7 @@ class messageAPI:
     # ==================================
     # RX_multi()
     # ==================================
-	def RX_Multi(self):
+	def RX_Multi(self, dest_list=None):
 		#handle Rx message
 		if( PC_TESTING ):
 			return_msg = self.lora_serr_conn.LoraReadMessageMulti()
@@ -192,7 +213,7 @@ class messageAPI:
 				print(hex(x),end = " ")
 			print("}")
 
-		return self.__parseRawLora( return_msg )
+		return self.__parseRawLora( return_msg, dest_list )
 
 
     # ==================================
@@ -220,8 +241,10 @@ class messageAPI:
     # ==================================
     # __parseRawLora()
     # ==================================
-	def __parseRawLora(self, message):
+	def __parseRawLora(self, message, dest_list=None):
 		#return format [ numRx, [[source, data, validity]] ]
+		#if dest_list is provided messages for any module in the list
+		#are accepted and format is [ numRx, [[source, data, validity, destination]] ]
 		num_rx = 0
 		start_index = 0
 		parsed_data = []
@@ -244,7 +267,12 @@ class messageAPI:
 			curr_msg = message[start_index:(start_index + 6 + dataSize)]
 
 			destination = curr_msg[0]
-			if destination == self.currentModule or destination == self.module_all:
+			if dest_list is None:
+				accept = destination == self.currentModule or destination == self.module_all
+			else:
+				accept = destination in dest_list or destination == self.module_all
+
+			if accept:
 				source = curr_msg[1]
 				version = ( curr_msg[3] & 0xF0 ) >> 4
 				key = curr_msg[4]
@@ -261,7 +289,10 @@ class messageAPI:
 				else:
 					valid = True
 
-				parsed_data.append( [source, data, valid] )
+				if dest_list is None:
+					parsed_data.append( [source, data, valid] )
+				else:
+					parsed_data.append( [source, data, valid, destination] )
 				num_rx = num_rx + 1
 
 			start_index = start_index + 6 + dataSize
@@ -393,8 +424,8 @@ class messageAPI:
 		result = self.spi.xfer2(msg)
 		current_fifo_ptr = result[1]
 
-		#get current fifo ptr
-		msg = [0x00 | 0x10, 0x00]
+		#get rx fifo base addr
+		msg = [0x00 | 0x0F, 0x00]
 		result = self.spi.xfer2(msg)
 		fifo_base_addr = result[1]
 
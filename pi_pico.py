@@ -16,9 +16,37 @@
 from lib.msgAPI import messageAPI
 from lib.consoleAPI import consoleAPI
 
-import RPi.GPIO as GPIO  
-import time
+from lib import clock
+from lib import hw
+
+import fcntl
+import hashlib
+import json
 import os
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+TEST_MODE_PATTERN = r"testmode\r\nTest Mode: (enabled|disabled)\r\n"
+
+POWER_HOLD_TIME  = 0.2  # time RUN is held low, enough for the rail to drop (s)
+BOOT_TIMEOUT     = 5.0  # max time to wait for the pico to come back (s)
+BOOT_PROBE_TIME  = 0.05 # console probe / ready pin poll interval (s)
+
+FLASH_RECORD_ENV_VAR = "STF_FLASH_RECORD"                  # opt in to the flash cache for every pico
+FLASH_RECORD_PATH    = os.environ.get( FLASH_RECORD_ENV_VAR ) # None, every load flashes
+FLASH_TIMEOUT        = 60  # max time for picotool to load an image (s)
+
+flash_record_lock = threading.Lock() # DUTs on one rig share the record file
+
+HEALTH_TIMEOUT = 0.2 # time the console has to answer a health check (s)
+
+session_cache = {}               # dut id -> attached pi_pico, see attach_session()
+session_lock  = threading.Lock()
 
 #---------------------------------------------------------------------
 #                          CLASSES
@@ -30,15 +58,33 @@ class pi_pico:
 	# ==================================
 	# Constructor
 	# ==================================
-	def __init__(self, test_mode = False, power_cycle_pin=23 ):
+	def __init__(self, test_mode = False, power_cycle_pin=23, ready_pin = None, boot_pattern = None,
+				 power_hold = POWER_HOLD_TIME, boot_timeout = BOOT_TIMEOUT, bus = 0, chip_select = 0,
+				 uart_port = '/dev/ttyS0', current_module = 0x00, list_of_modules = None, dut_id = None,
+				 flash_record_path = FLASH_RECORD_PATH, build_id_cmd = None, build_id_pattern = None,
+				 attach = False ):
+		if list_of_modules is None:
+			list_of_modules = [0x00,0x01]
+
 		self.msg_conn = messageAPI( 
-								bus = 0, 
-								chip_select = 0, 
-								currentModule = 0x00, 
-								listOfModules=[0x00,0x01] 
+								bus = bus, 
+								chip_select = chip_select, 
+								currentModule = current_module, 
+								listOfModules=list_of_modules 
 								)
-		self.console_conn = consoleAPI()
-		self.msg_conn.InitAPI()
+		self.console_conn = consoleAPI( port = uart_port )
+
+		# ------------------------------------
+		# firmware load cache, see load_software().
+		# Off unless a record file is given (or
+		# STF_FLASH_RECORD is set). build_id_
+		# pattern's first group is the build id
+		# printed by build_id_cmd
+		# ------------------------------------
+		self.dut_id            = ( uart_port if dut_id is None else dut_id )
+		self.flash_record_path = flash_record_path
+		self.build_id_cmd      = build_id_cmd
+		self.build_id_pattern  = build_id_pattern
 		
 		# ------------------------------------
 		# setup power cycle pin. Power cycle
@@ -48,9 +94,61 @@ class pi_pico:
 		# connects or disconnects the circuit
 		# ------------------------------------
 		self.power_cycle_pin = power_cycle_pin
-		GPIO.setmode(GPIO.BCM)
-		GPIO.setup(self.power_cycle_pin, GPIO.OUT )
+		self.gpio = hw.get_gpio() # RPi.GPIO, or simulated off the Pi
+		self.gpio.setmode(self.gpio.BCM)
+		self.gpio.setup(self.power_cycle_pin, self.gpio.OUT )
+
+		# ------------------------------------
+		# boot detection, an optional ready pin
+		# driven high by the pico, else a boot
+		# banner / the console answering
+		# ------------------------------------
+		self.ready_pin     = ready_pin
+		self.boot_pattern  = boot_pattern
+		self.power_hold    = power_hold
+		self.boot_timeout  = boot_timeout
+		self.boot_times    = [] # seconds from release to ready, per power cycle
+		self.boot_failures = 0
+		if self.ready_pin is not None:
+			self.gpio.setup(self.ready_pin, self.gpio.IN, pull_up_down=self.gpio.PUD_DOWN )
+
+		# ------------------------------------
+		# attach mode reuses a pico that is
+		# already up with the radio configured
+		# and is left running on exit. Its test
+		# mode is unknown, so it is read back
+		# from the console while setting it. The
+		# pico is reset if either check fails
+		# ------------------------------------
+		self.test_mode     = None # last test mode seen on the console, None if unknown
+		self.attached      = ( attach and self.health_check() )
 
+		if self.attached:
+			self.set_test_mode( test_mode )
+			self.attached = ( self.test_mode is not None )
+
+		self.reset_on_exit = not self.attached
+		if not self.attached:
+			self.msg_conn.InitAPI()
+			self.power_cycle()
+			self.set_test_mode( test_mode )
+
+	# ==================================
+	# health_check(): console answers and
+	# the radio still holds its config
+	# ==================================
+	def health_check( self ) -> 'bool':
+		if self.console_conn.send_and_expect( "", r"\r\n", HEALTH_TIMEOUT ) is None:
+			return False
+		return self.msg_conn.CheckInit()
+
+	# ==================================
+	# reset(): full reinit, test mode is
+	# restored afterwards
+	# ==================================
+	def reset( self ) -> 'None':
+		test_mode = bool( self.test_mode )
+		self.msg_conn.InitAPI()
 		self.power_cycle()
 		self.set_test_mode( test_mode )
 	
@@ -61,16 +159,18 @@ class pi_pico:
 		# ------------------------------------
 		# attempt to place pico into test mode
 		# ------------------------------------
-		rtn = self.console_conn.write_and_read( "testmode")
+		rtn = self.console_conn.send_and_expect( "testmode", TEST_MODE_PATTERN )
 		if self.__verify_test_mode( rtn, enabled ):
+			self.test_mode = enabled
 			return True
 
 		# ------------------------------------
 		# since first attempt failed, try again
 		# (toggle behavior)
 		# ------------------------------------
-		rtn = self.console_conn.write_and_read( "testmode")
+		rtn = self.console_conn.send_and_expect( "testmode", TEST_MODE_PATTERN )
 		if self.__verify_test_mode( rtn, enabled ):
+			self.test_mode = enabled
 			return False
 		
 		# ------------------------------------
@@ -79,40 +179,265 @@ class pi_pico:
 		# error and exit
 		# ------------------------------------
 		print("Test mode not working")
+		self.test_mode = None
 		return False
 	
 	# ==================================
 	# power_cycle()
 	# ==================================
-	def power_cycle( self ) -> 'None':
+	def power_cycle( self ) -> 'float':
 		# ------------------------------------
-		# Power Off, Sleep 2s, Power On
+		# Power Off, hold, Power On. With a
+		# ready pin the hold ends as soon as
+		# the pin drops (power_hold at most),
+		# otherwise it is the full power_hold
 		# ------------------------------------
-		GPIO.output(self.power_cycle_pin, GPIO.HIGH)
-		time.sleep(2)
-		GPIO.output(self.power_cycle_pin, GPIO.LOW)
-		time.sleep(1) #allow to come back online
+		self.gpio.output(self.power_cycle_pin, self.gpio.HIGH)
+		if self.ready_pin is not None:
+			deadline = clock.now() + self.power_hold
+			while self.gpio.input( self.ready_pin ) != self.gpio.LOW and clock.now() < deadline:
+				clock.sleep( min( BOOT_PROBE_TIME, deadline - clock.now() ) )
+		else:
+			clock.sleep( self.power_hold )
+		self.gpio.output(self.power_cycle_pin, self.gpio.LOW)
+		self.test_mode = None # unknown until set again
+
+		# ------------------------------------
+		# wait for the pico to come back online,
+		# returns the boot time (None on timeout)
+		# ------------------------------------
+		boot_time = self.wait_for_boot( self.boot_timeout )
+		if boot_time is None:
+			self.boot_failures = self.boot_failures + 1
+			print("Pico did not come back online after power cycle")
+		else:
+			self.boot_times.append( boot_time )
+		return boot_time
+
+	# ==================================
+	# wait_for_boot()
+	# ==================================
+	def wait_for_boot( self, timeout ) -> 'float':
+		release  = clock.now()
+		deadline = release + timeout
+
+		# ------------------------------------
+		# ready pin
+		# ------------------------------------
+		if self.ready_pin is not None:
+			while self.gpio.input( self.ready_pin ) != self.gpio.HIGH:
+				if clock.now() >= deadline:
+					return None
+				clock.sleep( BOOT_PROBE_TIME )
+			return clock.now() - release
+
+		# ------------------------------------
+		# boot banner / prompt
+		# ------------------------------------
+		if self.boot_pattern is not None:
+			if self.console_conn.capture_thread is not None:
+				found = self.console_conn.wait_for( self.boot_pattern, timeout, since = release )
+			else:
+				found = self.console_conn.expect( self.boot_pattern, timeout )
+			return None if found is None else clock.now() - release
+
+		# ------------------------------------
+		# no banner known, probe until the
+		# console echoes a carriage return
+		# ------------------------------------
+		probe = clock.deadline( timeout )
+		while not probe.expired():
+			if self.console_conn.send_and_expect( "", r"\r\n", BOOT_PROBE_TIME ) is not None:
+				return clock.now() - release
+		return None
+
+	# ==================================
+	# boot_stats()
+	# ==================================
+	def boot_stats( self ) -> 'dict':
+		stats = { 'count': len( self.boot_times ), 'failures': self.boot_failures }
+		if len( self.boot_times ) == 0:
+			return stats
+
+		ordered = sorted( self.boot_times )
+		stats['min']  = ordered[0]
+		stats['max']  = ordered[-1]
+		stats['mean'] = sum( ordered ) / len( ordered )
+		stats['p50']  = ordered[ ( len( ordered ) - 1 ) // 2 ]
+		stats['p95']  = ordered[ min( int( len( ordered ) * 0.95 ), len( ordered ) - 1 ) ]
+		return stats
 
 
 	# ==================================
 	# load_software()
 	# ==================================
-	def load_software( self, elf_file_path ) -> 'None':
+	def load_software( self, elf_file_path, force = False ) -> 'bool':
+		# ------------------------------------
+		# skip the flash if this DUT last loaded
+		# the same image (and, when configured,
+		# still reports the same build id)
+		# ------------------------------------
+		digest = file_sha256( elf_file_path )
+		record = self.__read_flash_record()
+		if not force and record is not None and record['sha256'] == digest:
+			if self.build_id_cmd is None or self.read_build_id() == record['build_id']:
+				return False
+
+		# ------------------------------------
+		# flash, record is dropped first so a
+		# failed load is never mistaken for a
+		# good one
+		# ------------------------------------
+		self.__write_flash_record( None )
 		self.console_conn.write_and_read( "bootsel" )
-		os.system( "picotool load {}".format( elf_file_path) )
+		try:
+			rtn = subprocess.run( [ "picotool", "load", elf_file_path ], capture_output=True, text=True, timeout=FLASH_TIMEOUT )
+		except subprocess.TimeoutExpired as error:
+			self.power_cycle()
+			raise( RuntimeError( "picotool load timed out after {} s: {}".format( FLASH_TIMEOUT, error.stdout ) ) )
 		self.power_cycle()
 
+		if rtn.returncode != 0:
+			raise( RuntimeError( "picotool load failed ({}): {}".format( rtn.returncode, rtn.stderr.strip() ) ) )
+
+		build_id = None if self.build_id_cmd is None else self.read_build_id()
+		self.__write_flash_record( { 'sha256': digest, 'elf': os.path.abspath( elf_file_path ), 'build_id': build_id } )
+		return True
+
+	# ==================================
+	# read_build_id()
+	# ==================================
+	def read_build_id( self ) -> 'str':
+		match = self.console_conn.send_and_expect( self.build_id_cmd, self.build_id_pattern )
+		return None if match is None else match.group(1)
+
+	# ==================================
+	# helper function: __read_flash_record()
+	# ==================================
+	def __read_flash_record( self ) -> 'dict':
+		if self.flash_record_path is None:
+			return None
+		with flash_record_locked( self.flash_record_path ):
+			return load_flash_records( self.flash_record_path ).get( self.dut_id )
+
+	# ==================================
+	# helper function: __write_flash_record()
+	# None removes this DUT's record
+	# ==================================
+	def __write_flash_record( self, record ) -> 'None':
+		if self.flash_record_path is None:
+			return
+		with flash_record_locked( self.flash_record_path ):
+			records = load_flash_records( self.flash_record_path )
+			if record is None:
+				records.pop( self.dut_id, None )
+			else:
+				records[ self.dut_id ] = record
+
+			# write a unique temp file then rename,
+			# so a crash never leaves a half written
+			# record file
+			record_dir = os.path.dirname( os.path.abspath( self.flash_record_path ) )
+			with tempfile.NamedTemporaryFile( "w", dir=record_dir, suffix=".tmp", delete=False ) as f:
+				tmp_path = f.name
+				try:
+					json.dump( records, f, indent=2 )
+				except BaseException:
+					f.close()
+					os.remove( tmp_path )
+					raise
+			os.replace( tmp_path, self.flash_record_path )
+
 	# ==================================
 	# helper function: __verify_test_mode()
 	# ==================================
-	def __verify_test_mode( self, rtn_str, enabled ) -> 'bool':
-		expected_str = ( "testmode\r\nTest Mode: enabled\r\n" if enabled  else "testmode\r\nTest Mode: disabled\r\n")
-		return ( rtn_str == expected_str )
+	def __verify_test_mode( self, rtn_match, enabled ) -> 'bool':
+		if rtn_match is None:
+			return False
+		expected_str = ( "enabled" if enabled else "disabled" )
+		return ( rtn_match.group(1) == expected_str )
 	
 	# ==================================
     # deconstructor
     # ==================================
 	def __del__(self):
+		# attached picos are left up for the next test
+		if not self.reset_on_exit:
+			return
+
 		# Reset test mode at end of test
 		self.set_test_mode( False )
-		self.power_cycle()
\ No newline at end of file
+		self.power_cycle()
+
+#---------------------------------------------------------------------
+#                          FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# attach_session(): returns the pico for
+# this DUT, reusing the one from earlier
+# tests in the session. It is only reset
+# when reset is asked for or its health
+# check fails. Takes pi_pico arguments
+# ==================================
+def attach_session( test_mode = False, reset = False, **kwargs ) -> 'pi_pico':
+	dut_id = kwargs.get( 'dut_id' )
+	if dut_id is None:
+		dut_id = kwargs.get( 'uart_port', '/dev/ttyS0' )
+
+	with session_lock:
+		pico = session_cache.get( dut_id )
+		if pico is None:
+			pico = pi_pico( test_mode = test_mode, attach = not reset, **kwargs )
+			session_cache[ dut_id ] = pico
+			return pico
+
+		if reset or not pico.health_check():
+			pico.reset()
+		if pico.test_mode != test_mode:
+			pico.set_test_mode( test_mode )
+		return pico
+
+# ==================================
+# end_sessions(): drops every attached
+# pico, resetting them if asked to
+# ==================================
+def end_sessions( reset = True ) -> 'None':
+	with session_lock:
+		for pico in session_cache.values():
+			pico.reset_on_exit = reset
+		session_cache.clear()
+
+# ==================================
+# file_sha256()
+# ==================================
+def file_sha256( file_path ) -> 'str':
+	digest = hashlib.sha256()
+	with open( file_path, "rb" ) as f:
+		for block in iter( lambda: f.read( 1 << 16 ), b"" ):
+			digest.update( block )
+	return digest.hexdigest()
+
+# ==================================
+# flash_record_locked(): holds the record
+# file's lock across a load-modify-replace,
+# both between threads and between test
+# processes sharing the file
+# ==================================
+@contextmanager
+def flash_record_locked( file_path ):
+	with flash_record_lock, open( file_path + ".lock", "a" ) as lock_file:
+		fcntl.flock( lock_file, fcntl.LOCK_EX )
+		try:
+			yield
+		finally:
+			fcntl.flock( lock_file, fcntl.LOCK_UN )
+
+# ==================================
+# load_flash_records(): dut id -> record
+# of the last image it was flashed with
+# ==================================
+def load_flash_records( file_path ) -> 'dict':
+	if not os.path.exists( file_path ):
+		return {}
+	with open( file_path, "r" ) as f:
+		return json.load( f )
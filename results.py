@@ -12,10 +12,146 @@
 #---------------------------------------------------------------------
 #                              IMPORTS
 #---------------------------------------------------------------------
+import atexit
+import html
+import json
+import math
 import os
+import re
+import shutil
+import sys
+import time
+import weakref
 import git
+from contextlib import contextmanager
 from datetime import datetime
+from xml.sax.saxutils import quoteattr
 
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+RESULTS_FLUSH_RECORDS  = 1000 # flush the results log after this many records
+RESULTS_FLUSH_INTERVAL = 1.0  # or after this long (s), whichever comes first
+
+REPORT_COLLAPSE_RUN = 5    # runs of this many passing cases or more are shown as a count
+REPORT_CHUNK        = 1000 # case entries per report write
+
+REPORT_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<title>Test Results</title>
+<style>
+  body { font-family: Arial, sans-serif; color: #333; line-height: 1.4; }
+  .container { width: 80%; margin: 0 auto; padding: 20px; border: 1px solid #ccc; border-radius: 10px; }
+  h1 { text-align: center; color: #444; margin-bottom: 20px; }
+  h2 { color: #555; border-bottom: 1px solid #eee; padding-bottom: 5px; margin-top: 20px; }
+  .info-table { width: 100%; border-collapse: collapse; margin-bottom: 15px; font-size: 0.9em; }
+  .info-table td { border: 1px solid #eee; padding: 5px; text-align: left; }
+  .info-table td:first-child { font-weight: bold; width: 150px; }
+  .test-case-block { border: 1px solid #ddd; margin-bottom: 10px; padding: 10px; border-radius: 5px; }
+  .test-case-header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 5px; }
+  .test-case-header h4 { margin: 0; color: #666; }
+  .status-pass { color: white; background-color: green; padding: 3px 8px; border-radius: 3px; font-size: 0.9em; }
+  .status-fail { color: white; background-color: red; padding: 3px 8px; border-radius: 3px; font-size: 0.9em; }
+  .details { padding-left: 15px; display: none; font-size: 0.9em; }
+  .detail { margin-bottom: 3px; }
+  .step-block { border: 1px solid #eee; margin-bottom: 8px; padding: 8px; border-radius: 5px; background-color: #f8f8f8; display: flex; justify-content: space-between; align-items: center; }
+  .step-tag { color: #555; font-style: italic; font-size: 0.9em; background-color: #ffdd57; padding: 3px 6px; border-radius: 3px; }
+  .run-block { border: 1px dashed #ddd; margin-bottom: 10px; padding: 10px; border-radius: 5px; color: #666; display: flex; justify-content: space-between; align-items: center; }
+  .pager { margin-bottom: 10px; }
+  .overall-pass { color: white; background-color: green; padding: 10px; border-radius: 5px; text-align: center; margin-top: 20px; font-weight: bold; }
+  .overall-fail { color: white; background-color: red; padding: 10px; border-radius: 5px; text-align: center; margin-top: 20px; font-weight: bold; }
+</style>
+</head>
+<body>
+<div class='container'>
+"""
+
+# pages through the embedded case entries, only one page is in the DOM
+REPORT_SCRIPT = """<script>
+var PAGE_SIZE = 200;
+var cases = JSON.parse(document.getElementById('cases').textContent);
+var view = cases;
+var page = 0;
+
+function el(tag, cls, text) {
+  var e = document.createElement(tag);
+  if (cls) e.className = cls;
+  if (text !== undefined) e.textContent = text;
+  return e;
+}
+
+function detail(label, text) {
+  var p = el('p', 'detail');
+  p.appendChild(el('b', null, label + ':'));
+  p.appendChild(document.createTextNode(' ' + text));
+  return p;
+}
+
+function caseBlock(c) {
+  var block;
+  if (c[0] === 's') {
+    block = el('div', 'step-block');
+    block.appendChild(el('span', null, c[1]));
+    if (c[2] !== null) block.appendChild(el('span', 'step-tag', c[2].toFixed(3) + ' s'));
+    return block;
+  }
+  if (c[0] === 'r') {
+    block = el('div', 'run-block');
+    block.appendChild(el('span', null, c[1] + ' passing cases: ' + c[2] + ' ... ' + c[3]));
+    block.appendChild(el('span', 'status-pass', 'Pass'));
+    return block;
+  }
+  block = el('div', 'test-case-block');
+  var header = el('div', 'test-case-header');
+  header.appendChild(el('h4', null, c[2]));
+  header.appendChild(el('span', c[1] ? 'status-pass' : 'status-fail', c[1] ? 'Pass' : 'Fail'));
+  var details = el('div', 'details');
+  details.appendChild(detail('Comparison', c[3]));
+  details.appendChild(detail('Expected', c[4]));
+  details.appendChild(detail('Actual', c[5]));
+  block.appendChild(header);
+  block.appendChild(details);
+  block.onclick = function() {
+    details.style.display = (details.style.display === 'block') ? 'none' : 'block';
+  };
+  return block;
+}
+
+function showPage(n) {
+  var pages = Math.max(1, Math.ceil(view.length / PAGE_SIZE));
+  page = Math.min(Math.max(n, 0), pages - 1);
+  var frag = document.createDocumentFragment();
+  for (var i = page * PAGE_SIZE; i < Math.min(view.length, (page + 1) * PAGE_SIZE); i++) {
+    frag.appendChild(caseBlock(view[i]));
+  }
+  var list = document.getElementById('case-list');
+  list.textContent = '';
+  list.appendChild(frag);
+  document.getElementById('page-info').textContent = 'page ' + (page + 1) + ' of ' + pages;
+}
+
+function applyFilter() {
+  var failOnly = document.getElementById('fail-only').checked;
+  view = failOnly ? cases.filter(function(c) { return c[0] === 'c' && !c[1]; }) : cases;
+  showPage(0);
+}
+
+showPage(0);
+</script>
+"""
+
+text_replacement = [ ( "\r",               "\\r" ),
+                     ( "\n",               "\\n" ),
+                     ( "\x1b[2J\x1b[0;0H", "[clear screen]" ) ]
+
+open_results = weakref.WeakSet() # closed at exit if __del__ never ran
+
+EXPORT_MAX_FAILURES = 100 # failing cases listed in a JSON summary
+
+exporter_types = {} # name -> ( exporter class, file suffix ), see register_exporter()
+
+xml_invalid = re.compile( "[\x00-\x08\x0b\x0c\x0e-\x1f]" )
 
 #---------------------------------------------------------------------
 #                          HELPER CLASSES
@@ -31,45 +167,126 @@ class consoleColor:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+class measurement:
+    def __init__(self, label ):
+        self.label   = label
+        self.elapsed = None # seconds, set when the with block exits
+
+# ================================
+# pass run: a run of passing cases in
+# the report. Only the first few entries
+# are kept, a long run is written as
+# [ "r", count, first case, last case ]
+# ================================
+class pass_run:
+    def __init__(self):
+        self.count   = 0
+        self.first   = None
+        self.last    = None
+        self.entries = [] # up to REPORT_COLLAPSE_RUN - 1, for short runs
+
+    def add( self, record ):
+        if self.count == 0:
+            self.first = record["case"]
+        self.last  = record["case"]
+        self.count = self.count + 1
+        if self.count < REPORT_COLLAPSE_RUN:
+            self.entries.append( [ "c", 1, record["case"], record["cmp"],
+                                   text_cleanser( record["expected"] ), text_cleanser( record["actual"] ) ] )
+        else:
+            self.entries = []
+
+    def flush( self ):
+        entries = self.entries if self.count < REPORT_COLLAPSE_RUN else [ [ "r", self.count, self.first, self.last ] ]
+        self.__init__()
+        return entries
+
 #---------------------------------------------------------------------
 #                             CLASSES
 #---------------------------------------------------------------------
 class results:
-    # ================================
-    # local variables
-    # ================================
-    __text_replacement = [ ( "\r",               "\\r" ),
-                           ( "\n",               "\\n" ),
-                           ( "\x1b[2J\x1b[0;0H", "[clear screen]" ) ]
-
     # ================================
     # results constructor
+    #
+    # every record is appended to a JSON
+    # lines log as it happens, only the
+    # pass/fail counts are kept in memory.
+    # hw_mode is stamped in the header, by
+    # default the mode lib.hw is running in
     # ================================
-    def __init__(self, fut ):
+    def __init__(self, fut, log_path = None, flush_records = RESULTS_FLUSH_RECORDS, flush_interval = RESULTS_FLUSH_INTERVAL,
+                 exports = None, hw_mode = None ):
+        self.closed          = True # nothing to publish until the log is open
+        self.exports         = [] if exports is None else list( exports )
+        for name in self.exports:
+            if name not in exporter_types:
+                raise( ValueError( "unknown results exporter {}, expected one of {}".format( name, list( exporter_types ) ) ) )
         self.file_under_test = fut
         self.date_time       = datetime.now()
         self.checksum        = ( git.Repo(search_parent_directories=True) ).head.object.hexsha
-        self.test_case_list  = []
         self.req_list        = []
+        self.num_pass        = 0
+        self.num_fail        = 0
+        self.pass_fail       = True
+        self.start_time      = time.monotonic() # record "t" is seconds since this
+        self.samples         = {}               # label -> [ seconds ], see measure()
+
+        self.log_path       = ( fut[:-3] + "_results.jsonl" if log_path is None else log_path )
+        self.log            = open( self.log_path, "w" )
+        self.flush_records  = flush_records
+        self.flush_interval = flush_interval
+        self.unflushed      = 0
+        self.last_flush     = time.monotonic()
+        self.closed         = False
+
+        self.__write_record( { "type": "header", "fut": fut, "date": self.date_time.isoformat(), "sha": self.checksum,
+                               "hw": ( hw_mode_in_use() if hw_mode is None else hw_mode ) } )
+        self.flush()
+        open_results.add( self )
 
     # ================================
     # results deconstructor
     # ================================
     def __del__(self):
+        self.close()
+
+    # ================================
+    # close: flushes the log and renders
+    # the report, only the first call
+    # does anything
+    # ================================
+    def close( self ):
+        if self.closed:
+            return
+        self.closed = True
+
+        self.__write_record( { "type": "end" } )
+        self.log.close()
         self.__publish_results()
 
+    # ================================
+    # flush
+    # ================================
+    def flush( self ):
+        self.log.flush()
+        self.unflushed  = 0
+        self.last_flush = time.monotonic()
+
     # ================================
     # requirement
     # ================================
     def test_requirement( self, req ):
         self.req_list.append( req )
+        self.__write_record( { "type": "req", "req": req } )
         print( consoleColor.HEADER + "Req Tested > "+ req )
 
     # ================================
     # test step
     # ================================
     def test_step( self, step ):
-         self.__global_compare( True, "step", 0, 0, step )
+        self.__write_record( { "type": "step", "step": str(step) } )
+        self.__console( True, "step", 0, 0, step )
+
     # ================================
     # compare equal
     # ================================
@@ -98,13 +315,76 @@ class results:
         cmp = expected > actual
         self.__global_compare( cmp, ">", expected, actual, case )
 
+    # ================================
+    # measure: times the with block and
+    # adds the elapsed seconds to the
+    # label's samples. With a limit the
+    # time is also checked as a case
+    # ================================
+    @contextmanager
+    def measure( self, label, limit = None ):
+        sample = measurement( label )
+        start  = time.monotonic()
+        try:
+            yield sample
+        finally:
+            sample.elapsed = time.monotonic() - start
+            self.samples.setdefault( label, [] ).append( sample.elapsed )
+            self.__write_record( { "type": "measure", "label": label, "elapsed": sample.elapsed } )
+
+        if limit is not None:
+            self.__global_compare( limit >= sample.elapsed, "time >=", limit, sample.elapsed, label )
+
+    # ================================
+    # compare latency: samples (seconds,
+    # or a measure() label) must meet the
+    # p50 / p99 limits, either limit may
+    # be None
+    # ================================
+    def compare_latency( self, samples, p50, p99, case ):
+        if isinstance( samples, str ):
+            samples = self.samples.get( samples, [] )
+
+        if len( samples ) == 0:
+            self.__global_compare( False, "latency", "p50 <= {}, p99 <= {}".format( p50, p99 ), "no samples", case )
+            return
+
+        ordered    = sorted( samples )
+        actual_p50 = percentile( ordered, 50 )
+        actual_p99 = percentile( ordered, 99 )
+        cmp = ( p50 is None or actual_p50 <= p50 ) and ( p99 is None or actual_p99 <= p99 )
+
+        expected = "p50 <= {}, p99 <= {}".format( p50, p99 )
+        actual   = "p50 = {:.6f}, p99 = {:.6f} (n = {})".format( actual_p50, actual_p99, len( ordered ) )
+        self.__global_compare( cmp, "latency", expected, actual, case )
+
     # ================================
     # global compare function
     # ================================
     def __global_compare( self, result, cmp_type, x, y, case ):
-        self.test_case_list.append( [result, cmp_type, x, y, case ] )
+        self.pass_fail = self.pass_fail and result
+        if result:
+            self.num_pass = self.num_pass + 1
+        else:
+            self.num_fail = self.num_fail + 1
+
+        self.__write_record( { "type": "case", "result": bool(result), "cmp": cmp_type, "expected": str(x), "actual": str(y), "case": str(case) } )
         self.__console( result, cmp_type, x, y, case )
 
+    # ================================
+    # write record: appends one record to
+    # the log, flushing periodically so a
+    # crash loses at most one interval
+    # ================================
+    def __write_record( self, record ):
+        now         = time.monotonic()
+        record["t"] = round( now - self.start_time, 6 )
+        self.log.write( json.dumps( record ) + "\n" )
+        self.unflushed = self.unflushed + 1
+
+        if self.unflushed >= self.flush_records or now - self.last_flush >= self.flush_interval:
+            self.flush()
+
     # ================================
     # console output
     # ================================
@@ -112,150 +392,414 @@ class results:
         if cmp_type == "step":
             print( consoleColor.HEADER + case )
             return
-        print( consoleColor.ENDC + case + ": " + self.__text_cleanser(x) + " " + cmp_type + " " + self.__text_cleanser(y) )
+        print( consoleColor.ENDC + case + ": " + text_cleanser(x) + " " + cmp_type + " " + text_cleanser(y) )
         color = consoleColor.OKGREEN if result is True else consoleColor.FAIL
         print( color + str(result) )
 
-    # ================================
-    # text cleanser
-    # ================================
-    def __text_cleanser( self, item ):
-        text = str(item)
-        
-        for orginal, replace in self.__text_replacement:
-            text = text.replace( orginal, replace ) 
-	
-        return text
-
-
     # ================================
     # publish results
     # ================================
     def __publish_results( self ):
-        # ============================
-        # initailize global pass/fail
-        # to true to start test
-        # ============================
-        pass_fail = True
-
-        # ============================
-        # format & open results file
-        # ============================
         results_file = self.file_under_test[:-3] + "_results.html"
-        f = open(results_file, "w")
+        pass_fail    = render_html( self.log_path, results_file )
+        if len( self.exports ) != 0:
+            export( self.log_path, make_exporters( self.exports, self.file_under_test[:-3] ) )
 
         # ============================
-        # add general header info (as a small table)
+        # Print overal result to console
         # ============================
-        f.write("<!DOCTYPE html>\n")
-        f.write("<html>\n")
-        f.write("<head>\n")
-        f.write("<title>Test Results</title>\n")
-        f.write("<style>\n")
-        f.write("  body { font-family: Arial, sans-serif; color: #333; line-height: 1.4; }\n")
-        f.write("  .container { width: 80%; margin: 0 auto; padding: 20px; border: 1px solid #ccc; border-radius: 10px; }\n")
-        f.write("  h1 { text-align: center; color: #444; margin-bottom: 20px; }\n")
-        f.write("  h2 { color: #555; border-bottom: 1px solid #eee; padding-bottom: 5px; margin-top: 20px; }\n")
-        f.write("  .info-table { width: 100%; border-collapse: collapse; margin-bottom: 15px; font-size: 0.9em; }\n")
-        f.write("  .info-table td { border: 1px solid #eee; padding: 5px; text-align: left; }\n")
-        f.write("  .info-table td:first-child { font-weight: bold; width: 150px; }\n")
-        f.write("  .test-case-block { border: 1px solid #ddd; margin-bottom: 10px; padding: 10px; border-radius: 5px; }\n")
-        f.write("  .test-case-header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 5px; }\n")
-        f.write("  .test-case-header h4 { margin: 0; color: #666; }\n")
-        f.write("  .status-pass { color: white; background-color: green; padding: 3px 8px; border-radius: 3px; font-size: 0.9em; }\n")
-        f.write("  .status-fail { color: white; background-color: red; padding: 3px 8px; border-radius: 3px; font-size: 0.9em; }\n")
-        f.write("  .details { padding-left: 15px; display: none; font-size: 0.9em; }\n")
-        f.write("  .detail { margin-bottom: 3px; }\n")
-        f.write("  .step-block { border: 1px solid #eee; margin-bottom: 8px; padding: 8px; border-radius: 5px; background-color: #f8f8f8; display: flex; justify-content: space-between; align-items: center; }\n")
-        f.write("  .step-tag { color: #555; font-style: italic; font-size: 0.9em; background-color: #ffdd57; padding: 3px 6px; border-radius: 3px; }\n")
-        f.write("  .overall-pass { color: white; background-color: green; padding: 10px; border-radius: 5px; text-align: center; margin-top: 20px; font-weight: bold; }\n")
-        f.write("  .overall-fail { color: white; background-color: red; padding: 10px; border-radius: 5px; text-align: center; margin-top: 20px; font-weight: bold; }\n")
-        f.write("</style>\n")
-        f.write("</head>\n")
-        f.write("<body>\n")
-        f.write("<div class='container'>\n")  # Start container div
-
-        f.write("<h1>{}  Results</h1>\n".format(self.file_under_test[:-3]))
-        f.write("<table class='info-table'>\n")
-        f.write("  <tr><td>File Under Test:</td><td>{}</td></tr>\n".format(os.path.basename(self.file_under_test)))
-        f.write("  <tr><td>Current Test:</td><td>{}</td></tr>\n".format(os.path.basename(results_file)))
-        f.write("  <tr><td>FUT sha:</td><td>{}</td></tr>\n".format(self.checksum))
-        f.write("  <tr><td>Date:</td><td>{}</td></tr>\n".format(self.date_time.ctime()))
-        f.write("</table>\n")
-
-        f.write("<h2>Requirements Tested</h2>\n")
-        if self.req_list:
-            f.write("<ul>\n")
-            for req in self.req_list:
-                f.write("  <li>{}</li>\n".format(req))
-            f.write("</ul>\n")
-        else:
-            f.write("<p>No requirements tested.</p>\n")
+        print( consoleColor.ENDC + "\nOverall Result: ")
+        color = consoleColor.OKGREEN if pass_fail is True else consoleColor.FAIL
+        print( color + str(pass_fail) )
 
-        # ============================
-        # run through test-cases (as collapsible blocks with status)
-        # ============================
-        f.write("<h2>Test Cases</h2>\n")
-        for index, [result, cmp_type, x, y, case ] in enumerate(self.test_case_list):
-            # =========================
-            # Special handling for step's
-            # =========================
-            if cmp_type == "step":
-                f.write(f"<div class='step-block'><span>{case}</span><!--<span class='step-tag'>Step</span>--></div>\n")
+
+class junit_exporter:
+    # ================================
+    # constructor: cases are streamed to
+    # a temp file since the testsuite
+    # counts are only known at the end
+    # ================================
+    def __init__(self, path ):
+        self.path      = path
+        self.tmp_path  = path + ".cases"
+        self.cases     = open( self.tmp_path, "w" )
+        self.classname = ""
+        self.last_time = 0.0
+
+    def begin( self, header ):
+        self.classname = os.path.basename( header.get( "fut", "" ) )[:-3]
+
+    def record( self, record ):
+        elapsed        = record.get( "t", self.last_time ) - self.last_time
+        self.last_time = record.get( "t", self.last_time )
+        if record["type"] != "case":
+            return
+
+        self.cases.write( "  <testcase classname={} name={} time=\"{:.6f}\"".format(
+            quoteattr( xml_text( self.classname ) ), quoteattr( xml_text( record["case"] ) ), elapsed ) )
+        if record["result"]:
+            self.cases.write( "/>\n" )
+            return
+
+        message = "{} {} {}".format( record["expected"], record["cmp"], record["actual"] )
+        self.cases.write( ">\n    <failure message={}/>\n  </testcase>\n".format( quoteattr( xml_text( message ) ) ) )
+
+    def end( self, summary ):
+        self.cases.close()
+
+        # --------------------------------
+        # a test that never finished is an
+        # error, even if every case passed
+        # --------------------------------
+        errors = 0 if summary["complete"] else 1
+
+        with open( self.path, "w" ) as f:
+            f.write( "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n" )
+            f.write( "<testsuites>\n" )
+            f.write( "<testsuite name={} tests=\"{}\" failures=\"{}\" errors=\"{}\" time=\"{:.6f}\" timestamp={}>\n".format(
+                quoteattr( xml_text( self.classname ) ), summary["tests"] + errors, summary["failed"], errors,
+                summary["duration"] or 0.0, quoteattr( summary["date"] ) ) )
+            with open( self.tmp_path, "r" ) as cases:
+                shutil.copyfileobj( cases, f )
+            if errors != 0:
+                f.write( "  <testcase classname={} name=\"incomplete\" time=\"0.000000\">\n".format( quoteattr( xml_text( self.classname ) ) ) )
+                f.write( "    <error message=\"results log has no end record, the test crashed or was killed\"/>\n  </testcase>\n" )
+            f.write( "</testsuite>\n" )
+            f.write( "</testsuites>\n" )
+        os.remove( self.tmp_path )
+
+
+class summary_exporter:
+    # ================================
+    # constructor: JSON summary, with up
+    # to EXPORT_MAX_FAILURES failing cases
+    # ================================
+    def __init__(self, path ):
+        self.path     = path
+        self.failures = []
+
+    def begin( self, header ):
+        pass
+
+    def record( self, record ):
+        if record["type"] == "case" and not record["result"] and len( self.failures ) < EXPORT_MAX_FAILURES:
+            self.failures.append( { key: record[ key ] for key in ( "case", "cmp", "expected", "actual", "t" ) if key in record } )
+
+    def end( self, summary ):
+        with open( self.path, "w" ) as f:
+            json.dump( dict( summary, failures = self.failures ), f, indent=2 )
+
+
+class detail_exporter:
+    # ================================
+    # constructor: one JSON line per step,
+    # case and measurement, tagged with the
+    # test name so files can be concatenated
+    # ================================
+    def __init__(self, path ):
+        self.path = path
+        self.f    = open( path, "w" )
+        self.test = ""
+
+    def begin( self, header ):
+        self.test = os.path.basename( header.get( "fut", "" ) )[:-3]
+
+    def record( self, record ):
+        if record["type"] in ( "step", "case", "measure" ):
+            self.f.write( json.dumps( dict( record, test = self.test ) ) + "\n" )
+
+    def end( self, summary ):
+        self.f.close()
+
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ================================
+# text cleanser
+# ================================
+def text_cleanser( item ):
+    text = str(item)
+
+    for orginal, replace in text_replacement:
+        text = text.replace( orginal, replace )
+
+    return text
+
+# ================================
+# hw_mode_in_use: mode lib.hw resolved
+# for this run, "unknown" when nothing
+# touched the hardware layer (or it is
+# not around)
+# ================================
+def hw_mode_in_use():
+    hw = sys.modules.get( "lib.hw" )
+    if hw is None or hw.active_mode is None:
+        return "unknown"
+    return hw.active_mode
+
+# ================================
+# percentile: nearest rank on sorted
+# samples
+# ================================
+def percentile( ordered, pct ):
+    rank = max( int( math.ceil( pct / 100.0 * len( ordered ) ) ), 1 )
+    return ordered[ rank - 1 ]
+
+# ================================
+# load records: streams the records
+# of a results log. A line cut short
+# by a crash ends the log
+# ================================
+def load_records( log_path, skip_types = () ):
+    skip_prefixes = tuple( '{{"type": "{}"'.format( record_type ) for record_type in skip_types )
+
+    with open( log_path, "r" ) as f:
+        for line in f:
+            # records are written with "type" first, so skipped
+            # types are dropped without decoding them
+            if len( skip_prefixes ) != 0 and line.startswith( skip_prefixes ):
                 continue
+            try:
+                yield json.loads( line )
+            except json.JSONDecodeError:
+                return
 
-            # =========================
-            # normal handling (as collapsible blocks with status)
-            # =========================
-            pass_fail = pass_fail and result
-            status_class = "status-pass" if result else "status-fail"
-            status_text = "Pass" if result else "Fail"
-            block_id = f"test-case-{index}"
-            f.write(f"<div class='test-case-block' onclick=\"toggleDetails('{block_id}')\">\n")
-            f.write(f"  <div class='test-case-header'>\n")
-            # f.write(f"    <h4>Test Case: {case}</h4>\n")
-            f.write(f"    <h4>{case}</h4>\n")
-            f.write(f"    <span class='{status_class}'>{status_text}</span>\n")
-            f.write("  </div>\n")
-            f.write(f"  <div id='{block_id}' class='details'>\n")
-            f.write(f"    <p class='detail'><b>Comparison:</b> {cmp_type}</p>\n")
-            f.write(f"    <p class='detail'><b>Expected:</b> {self.__text_cleanser(x)}</p>\n")
-            f.write(f"    <p class='detail'><b>Actual:</b> {self.__text_cleanser(y)}</p>\n")
-            f.write("  </div>\n")
-            f.write("</div>\n")
+# ================================
+# render html: writes the report for a
+# results log, returns overall pass/fail
+# ================================
+def render_html( log_path, results_file ):
+    # ============================
+    # first pass collects the header and
+    # requirements, cases are streamed in
+    # the second
+    # ============================
+    header     = {}
+    req_list   = []
+    step_times = []
+    end_time   = None
+    for record in load_records( log_path, skip_types = ( "case", "measure" ) ):
+        if record["type"] == "header":
+            header = record
+        elif record["type"] == "req":
+            req_list.append( record["req"] )
+        elif record["type"] == "step":
+            step_times.append( record["t"] )
+        elif record["type"] == "end":
+            end_time = record["t"]
 
-        # ============================
-        # Print overall result to file (at the end)
-        # ============================
-        f.write("<h2>Overall Result</h2>\n")
-        overall_result_class = "overall-pass" if pass_fail else "overall-fail"
-        f.write("<p class='{}'>Overall Test Result: {}</p>\n".format(overall_result_class, "Pass" if pass_fail else "Fail"))
+    # a step lasts until the next one, the
+    # last until the end of the test (unknown
+    # if the test never finished)
+    step_durations = [ later - earlier for earlier, later in zip( step_times, step_times[1:] ) ]
+    if len( step_times ) != 0:
+        step_durations.append( None if end_time is None else end_time - step_times[-1] )
 
-        # ============================
-        # Print overal result to console
-        # ============================
-        print( consoleColor.ENDC + "\nOverall Result: ")
-        color = consoleColor.OKGREEN if pass_fail is True else consoleColor.FAIL
-        print( color + str(pass_fail) )
+    file_under_test = header.get( "fut", os.path.basename( log_path ) )
+    date_time       = datetime.fromisoformat( header["date"] ) if "date" in header else datetime.now()
 
-        # ============================
-        # Add JavaScript for toggling details
-        # ============================
-        f.write("<script>\n")
-        f.write("function toggleDetails(id) {\n")
-        f.write("  var details = document.getElementById(id);\n")
-        f.write("  if (details.style.display === 'none') {\n")
-        f.write("    details.style.display = 'block';\n")
-        f.write("  } else {\n")
-        f.write("    details.style.display = 'none';\n")
-        f.write("  }\n")
-        f.write("}\n")
-        f.write("</script>\n")
+    f = open( results_file, "w" )
 
-        # ============================
-        # close file
-        # ============================
-        f.write("</div>\n")  # Close container div
-        f.write("</body>\n")
-        f.write("</html>\n")
-        f.close()
\ No newline at end of file
+    # ============================
+    # general header info (as a small
+    # table) and requirements, one write
+    # ============================
+    parts = [ REPORT_HEAD,
+              "<h1>{}  Results</h1>\n".format( html.escape( file_under_test[:-3] ) ),
+              "<table class='info-table'>\n",
+              "  <tr><td>File Under Test:</td><td>{}</td></tr>\n".format( html.escape( os.path.basename( file_under_test ) ) ),
+              "  <tr><td>Current Test:</td><td>{}</td></tr>\n".format( html.escape( os.path.basename( results_file ) ) ),
+              "  <tr><td>FUT sha:</td><td>{}</td></tr>\n".format( header.get( "sha", "" ) ),
+              "  <tr><td>Hardware:</td><td>{}</td></tr>\n".format( html.escape( header.get( "hw", "unknown" ) ) ),
+              "  <tr><td>Date:</td><td>{}</td></tr>\n".format( date_time.ctime() ),
+              "  <tr><td>Duration:</td><td>{}</td></tr>\n".format( "unfinished" if end_time is None else "{:.3f} s".format( end_time ) ),
+              "</table>\n",
+              "<h2>Requirements Tested</h2>\n" ]
+    if req_list:
+        parts.append( "<ul>\n" + "".join( "  <li>{}</li>\n".format( html.escape( req ) ) for req in req_list ) + "</ul>\n" )
+    else:
+        parts.append( "<p>No requirements tested.</p>\n" )
+    f.write( "".join( parts ) )
+
+    # ============================
+    # test cases are embedded as compact
+    # JSON and paged in the browser:
+    #   [ "s", step, duration ]
+    #   [ "c", pass, case, cmp, expected, actual ]
+    #   [ "r", count, first case, last case ]  (run of passes)
+    # ============================
+    f.write( "<script type='application/json' id='cases'>[" )
+
+    pass_fail = True
+    num_pass  = 0
+    num_fail  = 0
+    run       = pass_run()
+    chunk     = []    # encoded entries waiting to be written
+    first     = True
+    num_steps = 0
+
+    for record in load_records( log_path ):
+        if record["type"] == "step":
+            entries   = run.flush() + [ [ "s", record["step"], step_durations[ num_steps ] ] ]
+            num_steps = num_steps + 1
+        elif record["type"] != "case":
+            continue
+        elif record["result"]:
+            num_pass = num_pass + 1
+            run.add( record )
+            continue
+        else:
+            pass_fail = False
+            num_fail  = num_fail + 1
+            entries   = run.flush() + [ [ "c", 0, record["case"], record["cmp"],
+                                          text_cleanser( record["expected"] ), text_cleanser( record["actual"] ) ] ]
+
+        for entry in entries:
+            chunk.append( ( "" if first else "," ) + __json_for_html( entry ) )
+            first = False
+        if len( chunk ) >= REPORT_CHUNK:
+            f.write( "".join( chunk ) )
+            chunk = []
+
+    for entry in run.flush():
+        chunk.append( ( "" if first else "," ) + __json_for_html( entry ) )
+        first = False
+    chunk.append( "]</script>\n" )
+    f.write( "".join( chunk ) )
+
+    # ============================
+    # case list, overall result and the
+    # pager script
+    # ============================
+    overall_result_class = "overall-pass" if pass_fail else "overall-fail"
+    f.write( "".join( [
+        "<h2>Test Cases</h2>\n",
+        "<p>{} passed, {} failed</p>\n".format( num_pass, num_fail ),
+        "<div class='pager'><button onclick='showPage(page - 1)'>&lt; Prev</button> <span id='page-info'></span> ",
+        "<button onclick='showPage(page + 1)'>Next &gt;</button> ",
+        "<label><input type='checkbox' id='fail-only' onchange='applyFilter()'> failures only</label></div>\n",
+        "<div id='case-list'></div>\n",
+        "<h2>Overall Result</h2>\n",
+        "<p class='{}'>Overall Test Result: {}</p>\n".format( overall_result_class, "Pass" if pass_fail else "Fail" ),
+        REPORT_SCRIPT,
+        "</div>\n",  # Close container div
+        "</body>\n",
+        "</html>\n" ] ) )
+    f.close()
+
+    return pass_fail
+
+# ================================
+# json for html: compact JSON that is
+# safe inside a script element
+# ================================
+def __json_for_html( entry ):
+    return json.dumps( entry, separators=( ",", ":" ) ).replace( "</", "<\\/" )
+
+# ================================
+# xml text: strips characters XML 1.0
+# can not hold (console escape codes)
+# ================================
+def xml_text( item ):
+    return xml_invalid.sub( "?", text_cleanser( item ) )
+
+# ================================
+# export: feeds every record of a results
+# log to each exporter in a single pass
+# and returns the summary
+# ================================
+def export( log_path, exporters ):
+    summary   = { "fut": "", "sha": "", "date": "", "hw": "", "duration": None, "complete": True, "tests": 0,
+                  "passed": 0, "failed": 0, "result": "pass", "requirements": [] }
+    last_time = 0.0
+
+    for record in load_records( log_path ):
+        last_time = record.get( "t", last_time )
+
+        if record["type"] == "header":
+            summary.update( fut = record.get( "fut", "" ), sha = record.get( "sha", "" ), date = record.get( "date", "" ),
+                            hw = record.get( "hw", "" ) )
+            for exporter in exporters:
+                exporter.begin( record )
+        elif record["type"] == "req":
+            summary["requirements"].append( record["req"] )
+        elif record["type"] == "case":
+            summary["tests"] = summary["tests"] + 1
+            if record["result"]:
+                summary["passed"] = summary["passed"] + 1
+            else:
+                summary["failed"] = summary["failed"] + 1
+                summary["result"] = "fail"
+        elif record["type"] == "end":
+            summary["duration"] = record["t"]
+
+        for exporter in exporters:
+            exporter.record( record )
+
+    # ----------------------------
+    # a log without an end record is
+    # from a test that never finished
+    # ----------------------------
+    if summary["duration"] is None:
+        summary["duration"] = last_time
+        summary["complete"] = False
+        if summary["result"] == "pass":
+            summary["result"] = "incomplete"
+
+    for exporter in exporters:
+        exporter.end( summary )
+
+    return summary
+
+# ================================
+# register exporter: exporter_class( path )
+# must provide begin( header ), record(
+# record ) and end( summary )
+# ================================
+def register_exporter( name, exporter_class, suffix ):
+    exporter_types[ name ] = ( exporter_class, suffix )
+
+# ================================
+# make exporters: one exporter per name,
+# writing to base + the type's suffix
+# ================================
+def make_exporters( names, base ):
+    exporters = []
+    for name in names:
+        exporter_class, suffix = exporter_types[ name ]
+        exporters.append( exporter_class( base + suffix ) )
+    return exporters
+
+# ================================
+# close open results at exit
+# ================================
+def __close_open_results():
+    for result in list( open_results ):
+        result.close()
+
+atexit.register( __close_open_results )
+
+register_exporter( "junit",   junit_exporter,   "_results.xml" )
+register_exporter( "summary", summary_exporter, "_summary.json" )
+register_exporter( "detail",  detail_exporter,  "_detail.jsonl" )
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    if len( sys.argv ) < 3:
+        print( "usage: python results.py <results log> <html file> [{}] ...".format( "|".join( exporter_types ) ) )
+        return
+
+    print( "Overall Result: {}".format( render_html( sys.argv[1], sys.argv[2] ) ) )
+    if len( sys.argv ) > 3:
+        base    = sys.argv[1][:-len( "_results.jsonl" )] if sys.argv[1].endswith( "_results.jsonl" ) else sys.argv[1]
+        summary = export( sys.argv[1], make_exporters( sys.argv[3:], base ) )
+        print( "Exported {} cases: {}".format( summary["tests"], ", ".join( sys.argv[3:] ) ) )
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
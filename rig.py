@@ -0,0 +1,162 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       rig.py - multi DUT rig manager
+#
+#   DESCRIPTION:
+#       Describes the picos wired to this host in a JSON config file
+#       and hands out exclusive leases on them, so tests can run on
+#       every DUT at once. Each DUT entry holds the pi_pico constructor
+#       arguments for that pico:
+#
+#           { "duts": [ { "name": "dut0", "bus": 0, "chip_select": 0,
+#                         "uart_port": "/dev/ttyS0", "power_cycle_pin": 23,
+#                         "current_module": 0, "list_of_modules": [0, 1] } ],
+#             "flash_record": "rig0_flash_record.json" }
+#
+#       flash_record is optional and turns on the firmware load cache
+#       for every DUT on the rig, keyed by DUT name.
+#
+#           rig = rig_manager( "rig.json" )
+#           with rig.lease() as pico:
+#               ...
+#           results = rig.run( [ test_a, test_b ] )   # test( pico )
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from lib import clock
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class rig_manager:
+    # ==================================
+    # Constructor
+    #
+    # config is either a path to the JSON
+    # file or the already loaded dict.
+    # pico_class builds a DUT handle from
+    # its config entry, pi_pico by default
+    # ==================================
+    def __init__(self, config, pico_class = None ):
+        if isinstance( config, str ):
+            with open( config, "r" ) as f:
+                config = json.load( f )
+
+        if pico_class is None:
+            from lib.pi_pico import pi_pico
+            pico_class = pi_pico
+
+        self.pico_class = pico_class
+        self.duts       = {}   # name -> pi_pico kwargs
+        self.handles    = {}   # name -> handle, created on first lease
+        self.free       = []   # names not currently leased, in config order
+        self.lock       = threading.Condition()
+
+        for i, dut in enumerate( config["duts"] ):
+            dut  = dict( dut )
+            name = dut.pop( "name", "dut{}".format( i ) )
+            if name in self.duts:
+                raise( ValueError( "duplicate DUT name {} in rig config".format( name ) ) )
+            dut.setdefault( "dut_id", name ) # keys the pico's flash record
+            if "flash_record" in config:
+                dut.setdefault( "flash_record_path", config["flash_record"] )
+            self.duts[ name ] = dut
+            self.free.append( name )
+
+    # ==================================
+    # lease() - exclusive use of one DUT,
+    # any free one unless name is given.
+    # Raises TimeoutError if none frees up
+    # in time
+    # ==================================
+    @contextmanager
+    def lease( self, name = None, timeout = None ):
+        name = self.acquire( name, timeout )
+        try:
+            yield self.__handle( name )
+        finally:
+            self.release( name )
+
+    # ==================================
+    # acquire() - returns the leased name
+    # ==================================
+    def acquire( self, name = None, timeout = None ):
+        if name is not None and name not in self.duts:
+            raise( ValueError( "unknown DUT {}".format( name ) ) )
+
+        deadline = None if timeout is None else clock.deadline( timeout )
+        with self.lock:
+            while True:
+                if name is None and len( self.free ) != 0:
+                    return self.free.pop( 0 )
+                if name is not None and name in self.free:
+                    self.free.remove( name )
+                    return name
+
+                remaining = None if deadline is None else deadline.remaining()
+                if remaining is not None and remaining <= 0:
+                    raise( TimeoutError( "no DUT free within {} s".format( timeout ) ) )
+                self.lock.wait( remaining )
+
+    # ==================================
+    # release()
+    # ==================================
+    def release( self, name ):
+        with self.lock:
+            self.free.append( name )
+            self.lock.notify_all()
+
+    # ==================================
+    # run() - runs each test( pico ) on
+    # the next free DUT, one worker per
+    # DUT. Returns ( test, dut name,
+    # result, exception ) in test order
+    # ==================================
+    def run( self, tests, timeout = None ):
+        with ThreadPoolExecutor( max_workers=len( self.duts ) ) as pool:
+            futures = [ pool.submit( self.__run_one, test, timeout ) for test in tests ]
+            return [ future.result() for future in futures ]
+
+    # ==================================
+    # close() - drops every DUT handle,
+    # resetting the picos
+    # ==================================
+    def close( self ):
+        with self.lock:
+            self.handles = {}
+
+    # ==================================
+    # __run_one()
+    # ==================================
+    def __run_one( self, test, timeout ):
+        try:
+            name = self.acquire( None, timeout )
+        except TimeoutError as error:
+            return ( test, None, None, error )
+
+        try:
+            return ( test, name, test( self.__handle( name ) ), None )
+        except Exception as error:
+            return ( test, name, None, error )
+        finally:
+            self.release( name )
+
+    # ==================================
+    # __handle() - only the lease holder
+    # calls this, so handles for different
+    # DUTs are built in parallel
+    # ==================================
+    def __handle( self, name ):
+        if name not in self.handles:
+            self.handles[ name ] = self.pico_class( **self.duts[ name ] )
+        return self.handles[ name ]
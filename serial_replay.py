@@ -0,0 +1,314 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       serial_replay.py - record/replay serial transports
+#
+#   DESCRIPTION:
+#       recording_transport wraps a serial.Serial and logs every write
+#       and timestamped read to a compact binary file. replay_transport
+#       feeds a recording back to consoleAPI without hardware, either as
+#       fast as possible or at the recorded timing:
+#
+#           conn = consoleAPI( transport=replay_transport( "run.bin" ) )
+#
+#       Fast replay should run under a clock.virtual_clock, which the
+#       transport moves to each recorded timestamp so timeouts expire
+#       exactly as they did on the rig. Recordings can be dumped with:
+#
+#           python -m lib.serial_replay run.bin
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import struct
+import sys
+import threading
+from enum import IntEnum
+
+from lib import clock
+
+#---------------------------------------------------------------------
+#                              CONSTANTS
+#---------------------------------------------------------------------
+REPLAY_MAGIC     = b'SRPL'
+REPLAY_VERSION   = 1
+REPLAY_MAX_CHUNK = 0xFFFF # longer reads/writes are split over records
+
+# Record: time since recording start, kind, num bytes, followed by bytes
+REPLAY_HEADER = struct.Struct( '<4sB' )
+REPLAY_RECORD = struct.Struct( '<dBH' )
+
+#---------------------------------------------------------------------
+#                            HELPER CLASSES
+#---------------------------------------------------------------------
+class record_kind(IntEnum):
+    WRITE = 0
+    READ  = 1
+    FLUSH = 2
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class recording_transport():
+    # ==================================
+    # constructor()
+    # ==================================
+    def __init__(self, conn, file_path ):
+        self.conn       = conn
+        self.file       = open( file_path, "wb" )
+        self.start_time = clock.now()
+        self.lock       = threading.Lock() # a capture thread reads while the test writes
+
+        self.file.write( REPLAY_HEADER.pack( REPLAY_MAGIC, REPLAY_VERSION ) )
+
+    # ==================================
+    # timeout - forwarded to the port
+    # ==================================
+    @property
+    def timeout( self ):
+        return self.conn.timeout
+
+    @timeout.setter
+    def timeout( self, value ):
+        self.conn.timeout = value
+
+    # ==================================
+    # in_waiting
+    # ==================================
+    @property
+    def in_waiting( self ):
+        return self.conn.in_waiting
+
+    # ==================================
+    # write()
+    # ==================================
+    def write( self, data ):
+        data = bytes( data )
+        self.__record( record_kind.WRITE, data )
+        return self.conn.write( data )
+
+    # ==================================
+    # read() - empty reads (timeouts) are
+    # recorded too so replay sees them
+    # ==================================
+    def read( self, size = 1 ):
+        data = self.conn.read( size )
+        self.__record( record_kind.READ, data )
+        return data
+
+    # ==================================
+    # reset_input_buffer()
+    # ==================================
+    def reset_input_buffer( self ):
+        self.__record( record_kind.FLUSH, b"" )
+        self.conn.reset_input_buffer()
+
+    # ==================================
+    # flushInput() - old pyserial name
+    # ==================================
+    def flushInput( self ):
+        self.reset_input_buffer()
+
+    # ==================================
+    # close()
+    # ==================================
+    def close( self ):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+        self.conn.close()
+
+    # ==================================
+    # __record() - records are built whole
+    # and written under the lock so reads
+    # and writes from different threads
+    # never interleave
+    # ==================================
+    def __record( self, kind, data ):
+        timestamp = clock.now() - self.start_time
+        records   = bytearray()
+        for offset in range( 0, max( len( data ), 1 ), REPLAY_MAX_CHUNK ):
+            chunk = data[ offset : offset + REPLAY_MAX_CHUNK ]
+            records += REPLAY_RECORD.pack( timestamp, kind, len( chunk ) )
+            records += chunk
+
+        with self.lock:
+            if not self.file.closed:
+                self.file.write( records )
+
+
+class replay_transport():
+    # ==================================
+    # constructor()
+    #
+    # realtime=True sleeps until each
+    # read's recorded time, otherwise
+    # reads return immediately. Reads and
+    # writes are replayed from separate
+    # cursors so a capture thread reading
+    # alongside the test stays in step
+    # ==================================
+    def __init__(self, file_path, realtime = False ):
+        records         = load_recording( file_path )
+        self.reads      = [ ( timestamp, data ) for timestamp, kind, data in records if kind == record_kind.READ ]
+        self.expected   = [ data for timestamp, kind, data in records if kind == record_kind.WRITE ]
+        self.realtime   = realtime
+        self.next_read  = 0
+        self.next_write = 0
+        self.pending    = b""  # rest of a recorded read not yet consumed
+        self.timeout    = None
+        self.start_time = clock.now()
+
+        self.writes     = []   # every write made during replay
+        self.mismatches = []   # ( expected, actual ) writes that differ
+
+    # ==================================
+    # in_waiting
+    # ==================================
+    @property
+    def in_waiting( self ):
+        if len( self.pending ) != 0:
+            return len( self.pending )
+
+        if self.next_read >= len( self.reads ):
+            return 0
+        timestamp, data = self.reads[ self.next_read ]
+        if self.realtime and timestamp > self.__elapsed():
+            return 0
+        return len( data )
+
+    # ==================================
+    # write() - checked against the
+    # recorded writes, never blocks
+    # ==================================
+    def write( self, data ):
+        data = bytes( data )
+        self.writes.append( data )
+
+        expected = None
+        if self.next_write < len( self.expected ):
+            expected        = self.expected[ self.next_write ]
+            self.next_write = self.next_write + 1
+        if expected != data:
+            self.mismatches.append( ( expected, data ) )
+        return len( data )
+
+    # ==================================
+    # read()
+    # ==================================
+    def read( self, size = 1 ):
+        if len( self.pending ) == 0:
+            # --------------------------------
+            # recording exhausted, behave like
+            # a timed out port
+            # --------------------------------
+            if self.next_read >= len( self.reads ):
+                if self.timeout is not None:
+                    clock.sleep( self.timeout )
+                return b""
+
+            timestamp, self.pending = self.reads[ self.next_read ]
+            self.next_read = self.next_read + 1
+            self.__wait_until( timestamp )
+
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    # ==================================
+    # reset_input_buffer() - anything the
+    # rig flushed was never recorded
+    # ==================================
+    def reset_input_buffer( self ):
+        self.pending = b""
+
+    # ==================================
+    # flushInput() - old pyserial name
+    # ==================================
+    def flushInput( self ):
+        self.reset_input_buffer()
+
+    # ==================================
+    # close()
+    # ==================================
+    def close( self ):
+        pass
+
+    # ==================================
+    # done() - True once every recorded
+    # read has been replayed
+    # ==================================
+    def done( self ):
+        return self.next_read >= len( self.reads ) and len( self.pending ) == 0
+
+    # ==================================
+    # __wait_until() - recorded time of a
+    # read, in real or virtual time
+    # ==================================
+    def __wait_until( self, timestamp ):
+        if self.realtime:
+            clock.sleep( max( timestamp - self.__elapsed(), 0.0 ) )
+            return
+
+        active_clock = clock.get_clock()
+        if hasattr( active_clock, "set" ):
+            active_clock.set( self.start_time + timestamp )
+
+    # ==================================
+    # __elapsed()
+    # ==================================
+    def __elapsed( self ):
+        return clock.now() - self.start_time
+
+#---------------------------------------------------------------------
+#                              FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# load_recording() - list of
+# ( time, kind, bytes )
+# ==================================
+def load_recording( file_path ):
+    with open( file_path, "rb" ) as f:
+        raw = f.read()
+
+    magic, version = REPLAY_HEADER.unpack_from( raw, 0 )
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise( ValueError( "{} is not a supported serial recording".format( file_path ) ) )
+
+    records = []
+    offset  = REPLAY_HEADER.size
+    while offset < len( raw ):
+        timestamp, kind, num_bytes = REPLAY_RECORD.unpack_from( raw, offset )
+        offset = offset + REPLAY_RECORD.size
+        records.append( ( timestamp, kind, raw[ offset : offset + num_bytes ] ) )
+        offset = offset + num_bytes
+
+    return records
+
+# ==================================
+# format_recording()
+# ==================================
+def format_recording( records ):
+    lines = []
+    for timestamp, kind, data in records:
+        lines.append( "{:12.6f} {:<5}: {}".format( timestamp, record_kind( kind ).name, repr( data )[2:-1] ) )
+    return lines
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    if len( sys.argv ) != 2:
+        print( "usage: python -m lib.serial_replay <recording file>" )
+        return
+
+    for line in format_recording( load_recording( sys.argv[1] ) ):
+        print( line )
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       lora_network_sim.py - discrete event LoRa network simulator
+#
+#   DESCRIPTION:
+#       Runs N real Mailbox instances over a shared virtual LoRa
+#       channel. Frames go through the real msgAPI framing/CRC (via
+#       msgAPI_sim), take LoRa airtime on the channel, and can be lost
+#       to collisions, half duplex, random loss or bit errors. Each
+#       node runs on its own (skewed) clock. Simulated time advances
+#       from event to event (and drives the library's virtual clock
+#       while running), so thousands of rounds take seconds.
+#
+#       A lost round update leaves nobody holding the turn, so nodes
+#       model a turn timeout: a node that sees the round stuck for
+#       turn_timeout passes the turn on to the next module itself:
+#
+#           python -m lib.util.lora_network_sim
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import copy
+import heapq
+import io
+import math
+import random
+import time
+from contextlib import redirect_stdout
+
+from lib import clock
+from lib.mailbox import Mailbox
+from lib.util.msgAPI_sim import messageAPI
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+# default LoRa modem settings (matches SX127x reset config)
+DEFAULT_SF        = 7
+DEFAULT_BW        = 125000
+DEFAULT_CR        = 1    # 4/5
+DEFAULT_PREAMBLE  = 8
+
+# default node timing, mirrors Mailbox.runtime(): rx, wait, tx
+DEFAULT_PERIOD    = 0.5  # time between runtime() calls (s)
+DEFAULT_TX_DELAY  = 0.1  # time between rx_runtime() and tx_runtime() (s)
+DEFAULT_TURN_TIMEOUT = 4 * DEFAULT_PERIOD # round unchanged this long, pass the turn on (s)
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# lora_airtime()
+#
+# DESC: time on air of a LoRa packet in
+#       seconds (explicit header, CRC on)
+# ==================================
+def lora_airtime( num_bytes, sf = DEFAULT_SF, bw = DEFAULT_BW, cr = DEFAULT_CR, preamble = DEFAULT_PREAMBLE ):
+    t_sym = ( 1 << sf ) / bw
+    low_dr_optimize = 1 if t_sym > 0.016 else 0
+
+    payload_symbols = 8 + max( math.ceil( ( 8 * num_bytes - 4 * sf + 28 + 16 ) / ( 4 * ( sf - 2 * low_dr_optimize ) ) ) * ( cr + 4 ), 0 )
+    return ( preamble + 4.25 ) * t_sym + payload_symbols * t_sym
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class event_queue:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, sim_clock ):
+        self.now    = 0.0
+        self.events = []
+        self.seq    = 0 # keeps ordering stable for equal times
+        self.clock  = sim_clock
+
+    # ==================================
+    # schedule()
+    # ==================================
+    def schedule( self, delay, callback, *args ):
+        heapq.heappush( self.events, ( self.now + delay, self.seq, callback, args ) )
+        self.seq = self.seq + 1
+
+    # ==================================
+    # run() - process events up to time
+    # ==================================
+    def run( self, until ):
+        while len( self.events ) != 0 and self.events[0][0] <= until:
+            self.now, _, callback, args = heapq.heappop( self.events )
+            self.clock.set( self.now )
+            callback( *args )
+        self.now = until
+        self.clock.set( self.now )
+
+
+class virtual_channel:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, events, rng, loss_rate = 0.0, bit_error_rate = 0.0,
+                 sf = DEFAULT_SF, bw = DEFAULT_BW, cr = DEFAULT_CR, preamble = DEFAULT_PREAMBLE ):
+        self.events         = events
+        self.rng            = rng
+        self.loss_rate      = loss_rate
+        self.bit_error_rate = bit_error_rate
+        self.modem          = ( sf, bw, cr, preamble )
+        self.radios         = []
+        self.active         = [] # in flight tx: [ start, end, radio, frame, collided ]
+        self.tx_busy        = {} # radio -> time its tx queue empties
+
+        self.stats = { 'tx_frames': 0, 'tx_bytes': 0, 'delivered': 0, 'collisions': 0,
+                       'half_duplex': 0, 'lost': 0, 'bit_errors': 0 }
+
+    # ==================================
+    # attach()
+    # ==================================
+    def attach( self, radio ):
+        self.radios.append( radio )
+        self.tx_busy[ radio ] = 0.0
+
+    # ==================================
+    # transmit() - called by msgAPI_sim
+    # ==================================
+    def transmit( self, radio, frame ):
+        # --------------------------------
+        # Frames from one radio go out back
+        # to back, like the blocking Tx in
+        # msgAPI
+        # --------------------------------
+        start = max( self.events.now, self.tx_busy[ radio ] )
+        end   = start + lora_airtime( len( frame ), *self.modem )
+        self.tx_busy[ radio ] = end
+
+        self.stats['tx_frames'] = self.stats['tx_frames'] + 1
+        self.stats['tx_bytes']  = self.stats['tx_bytes'] + len( frame )
+
+        self.events.schedule( start - self.events.now, self.__tx_start, [ start, end, radio, list( frame ), False ] )
+
+    # ==================================
+    # __tx_start()
+    # ==================================
+    def __tx_start( self, tx ):
+        # --------------------------------
+        # Any overlap corrupts both frames
+        # (no capture effect modelled)
+        # --------------------------------
+        self.active = [ other for other in self.active if other[1] > tx[0] ]
+        for other in self.active:
+            other[4] = True
+            tx[4]    = True
+
+        self.active.append( tx )
+        self.events.schedule( tx[1] - tx[0], self.__tx_end, tx )
+
+    # ==================================
+    # __tx_end()
+    # ==================================
+    def __tx_end( self, tx ):
+        start, end, sender, frame, collided = tx
+
+        # --------------------------------
+        # A collided frame is lost at every
+        # receiver, count it once
+        # --------------------------------
+        if collided:
+            self.stats['collisions'] = self.stats['collisions'] + 1
+            return
+
+        for radio in self.radios:
+            if radio is sender:
+                continue
+
+            # ----------------------------
+            # Half duplex, a radio that was
+            # transmitting cannot receive
+            # ----------------------------
+            if self.tx_busy[ radio ] > start and self.__was_transmitting( radio, start, end ):
+                self.stats['half_duplex'] = self.stats['half_duplex'] + 1
+                continue
+
+            if self.rng.random() < self.loss_rate:
+                self.stats['lost'] = self.stats['lost'] + 1
+                continue
+
+            radio.rx_raw_fill( self.__apply_bit_errors( frame ) )
+            self.stats['delivered'] = self.stats['delivered'] + 1
+
+    # ==================================
+    # __was_transmitting()
+    # ==================================
+    def __was_transmitting( self, radio, start, end ):
+        for other_start, other_end, other_radio, frame, collided in self.active:
+            if other_radio is radio and other_start < end and other_end > start:
+                return True
+        return False
+
+    # ==================================
+    # __apply_bit_errors()
+    # ==================================
+    def __apply_bit_errors( self, frame ):
+        if self.bit_error_rate == 0.0:
+            return frame
+
+        corrupted = list( frame )
+        for i in range( len( corrupted ) ):
+            for bit in range( 8 ):
+                if self.rng.random() < self.bit_error_rate:
+                    corrupted[i] = corrupted[i] ^ ( 1 << bit )
+
+        if corrupted != frame:
+            self.stats['bit_errors'] = self.stats['bit_errors'] + 1
+        return corrupted
+
+
+class sim_node:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, network, module, list_of_modules, mailbox_map, skew_ppm = 0.0,
+                 period = DEFAULT_PERIOD, tx_delay = DEFAULT_TX_DELAY, turn_timeout = DEFAULT_TURN_TIMEOUT ):
+        self.network      = network
+        self.module       = module
+        self.skew         = 1.0 + skew_ppm * 1e-6
+        self.period       = period
+        self.tx_delay     = tx_delay
+        self.turn_timeout = turn_timeout
+
+        with redirect_stdout( io.StringIO() ):
+            self.msg_conn = messageAPI( bus = 0, chip_select = 0, currentModule = module,
+                                        listOfModules = list_of_modules, channel = network.channel )
+        self.mailbox  = Mailbox( self.msg_conn, mailbox_map )
+
+        self.turns       = 0 # number of tx_runtime() calls where we transmitted
+        self.rx_errors   = 0 # frames that passed CRC but could not be parsed
+        self.recoveries  = 0 # turns passed on after turn_timeout
+        self.last_round  = None
+        self.last_change = 0.0 # sim time current_round last changed
+
+    # ==================================
+    # start()
+    # ==================================
+    def start( self, offset ):
+        self.network.events.schedule( offset, self.__rx )
+
+    # ==================================
+    # __rx()
+    # ==================================
+    def __rx( self ):
+        try:
+            self.mailbox.rx_runtime()
+        except ( IndexError, ValueError ):
+            self.rx_errors = self.rx_errors + 1
+
+        self.network.events.schedule( self.tx_delay * self.skew, self.__tx )
+
+    # ==================================
+    # __tx()
+    # ==================================
+    def __tx( self ):
+        self.__check_turn()
+        if self.mailbox.current_round == self.module:
+            self.turns = self.turns + 1
+        self.mailbox.tx_runtime()
+
+        self.network.events.schedule( ( self.period - self.tx_delay ) * self.skew, self.__rx )
+
+    # ==================================
+    # __check_turn() - turn timeout, if the
+    # round has not moved for turn_timeout
+    # the holder's update was lost, assume
+    # its turn is over and move to the next
+    # module. Whoever transmits next resyncs
+    # everyone with its round update
+    # ==================================
+    def __check_turn( self ):
+        now = self.network.events.now
+        if self.mailbox.current_round != self.last_round:
+            self.last_round  = self.mailbox.current_round
+            self.last_change = now
+            return
+
+        if self.mailbox.current_round == self.module or now - self.last_change < self.turn_timeout * self.skew:
+            return
+
+        num_modules = len( self.msg_conn.listOfModules )
+        self.mailbox.current_round = ( self.mailbox.current_round + 1 ) % num_modules
+        self.recoveries  = self.recoveries + 1
+        self.last_round  = self.mailbox.current_round
+        self.last_change = now
+
+
+class network_sim:
+    # ==================================
+    # Constructor
+    #
+    # mailbox_map is the shared map
+    # definition, each node gets its own
+    # copy. skew_ppm is a list (one per
+    # module) of clock skews
+    # ==================================
+    def __init__(self, list_of_modules, mailbox_map, seed = 0, loss_rate = 0.0, bit_error_rate = 0.0,
+                 skew_ppm = None, period = DEFAULT_PERIOD, tx_delay = DEFAULT_TX_DELAY,
+                 turn_timeout = DEFAULT_TURN_TIMEOUT, **modem ):
+        self.rng     = random.Random( seed )
+        self.clock   = clock.virtual_clock()
+        self.events  = event_queue( self.clock )
+        self.channel = virtual_channel( self.events, self.rng, loss_rate, bit_error_rate, **modem )
+
+        skew_ppm   = [ 0.0 ] * len( list_of_modules ) if skew_ppm is None else skew_ppm
+        self.nodes = []
+        for module, skew in zip( list_of_modules, skew_ppm ):
+            node = sim_node( self, module, list_of_modules, copy.deepcopy( mailbox_map ), skew, period, tx_delay, turn_timeout )
+            self.channel.attach( node.msg_conn )
+            self.nodes.append( node )
+
+        # --------------------------------
+        # Stagger node start so they are
+        # not perfectly in phase
+        # --------------------------------
+        for node in self.nodes:
+            node.start( self.rng.uniform( 0, period ) )
+
+    # ==================================
+    # run()
+    #
+    # DESC: runs for sim_time seconds of
+    #       simulated time. Mailbox console
+    #       output is discarded if quiet
+    # ==================================
+    def run( self, sim_time, quiet = True ):
+        # --------------------------------
+        # Library sleeps/timestamps follow
+        # simulated time while running
+        # --------------------------------
+        previous_clock = clock.set_clock( self.clock )
+        try:
+            if quiet:
+                with redirect_stdout( io.StringIO() ):
+                    self.events.run( self.events.now + sim_time )
+            else:
+                self.events.run( self.events.now + sim_time )
+        finally:
+            clock.set_clock( previous_clock )
+
+    # ==================================
+    # run_rounds() - run until every node
+    # has had num_rounds turns
+    #
+    # NOTE: a lost round update stalls the
+    # turn until the turn timeout passes it
+    # on, give up after max_time anyway
+    # (default: 10x the ideal run time)
+    # ==================================
+    def run_rounds( self, num_rounds, quiet = True, step = 1.0, max_time = None ):
+        if max_time is None:
+            max_time = self.events.now + 10 * num_rounds * len( self.nodes ) * self.nodes[0].period
+
+        while min( node.turns for node in self.nodes ) < num_rounds:
+            if self.events.now >= max_time:
+                return False
+            self.run( step, quiet )
+
+        return True
+
+    # ==================================
+    # stats()
+    # ==================================
+    def stats( self ):
+        rounds = min( node.turns for node in self.nodes )
+        stats  = dict( self.channel.stats )
+        stats['sim_time']   = self.events.now
+        stats['rounds']     = rounds
+        stats['round_time'] = self.events.now / rounds if rounds != 0 else None
+        stats['throughput'] = stats['delivered'] / self.events.now if self.events.now != 0 else 0.0
+        stats['rx_errors']  = sum( node.rx_errors for node in self.nodes )
+        stats['recoveries'] = sum( node.recoveries for node in self.nodes )
+        return stats
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+# ==================================
+# ring_map() - each module sends one
+# value to the next module every round
+# ==================================
+def ring_map( list_of_modules ):
+    mailbox_map = []
+    for i, module in enumerate( list_of_modules ):
+        dest = list_of_modules[ ( i + 1 ) % len( list_of_modules ) ]
+        mailbox_map.append( [ 0, '1', False, 'TX', module, dest, 'u16' ] )
+    return mailbox_map
+
+def main():
+    num_rounds = 1000
+    print( "{:>5} {:>6} {:>10} {:>10} {:>12} {:>10} {:>8} {:>10}".format(
+        "nodes", "loss", "sim (s)", "wall (s)", "round (ms)", "frames/s", "lost", "recovered" ) )
+
+    for num_nodes, loss_rate in ( ( 2, 0.0 ), ( 5, 0.0 ), ( 10, 0.0 ), ( 5, 0.05 ) ):
+        modules = list( range( num_nodes ) )
+        sim     = network_sim( modules, ring_map( modules ), loss_rate = loss_rate, skew_ppm = [ 20.0 * i for i in modules ] )
+
+        start = time.perf_counter()
+        if not sim.run_rounds( num_rounds ):
+            print( "{:>5} stalled after {} rounds".format( num_nodes, sim.stats()['rounds'] ) )
+        wall  = time.perf_counter() - start
+
+        stats = sim.stats()
+        lost  = stats['lost'] + stats['collisions'] + stats['half_duplex']
+        print( "{:>5} {:>6.2f} {:>10.1f} {:>10.2f} {:>12.1f} {:>10.2f} {:>8} {:>10}".format(
+            num_nodes, loss_rate, stats['sim_time'], wall, stats['round_time'] * 1e3, stats['throughput'], lost, stats['recoveries'] ) )
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       lora_serial_emu.py - emulator of the pico serial LoRa bridge
+#
+#   DESCRIPTION:
+#       Opens a pseudo-terminal pair and answers the bridge commands
+#       used by lora_over_serial ("lora send", "lora get",
+#       "lora init rx" and binary mode) so lora_serial can be tested
+#       and benchmarked on any Linux box. Emulators attached to the
+#       same emu_channel hear each other's frames:
+#
+#           python -m lib.util.lora_serial_emu
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import os
+import random
+import select
+import threading
+import time
+import tty
+from collections import deque
+
+from lib import lora_over_serial as bridge
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+EMU_POLL_TIME = 0.05 # how often the emulator thread checks for stop (s)
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class emu_channel:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, loss_rate = 0.0, seed = 0 ):
+        self.loss_rate = loss_rate
+        self.rng       = random.Random( seed )
+        self.emulators = []
+        self.lock      = threading.Lock()
+        self.stats     = { 'tx_frames': 0, 'delivered': 0, 'lost': 0 }
+
+    # ==================================
+    # attach()
+    # ==================================
+    def attach( self, emulator ):
+        self.emulators.append( emulator )
+
+    # ==================================
+    # transmit()
+    # ==================================
+    def transmit( self, sender, frame ):
+        with self.lock:
+            self.stats['tx_frames'] = self.stats['tx_frames'] + 1
+            for emulator in self.emulators:
+                if emulator is sender:
+                    continue
+                if self.rng.random() < self.loss_rate:
+                    self.stats['lost'] = self.stats['lost'] + 1
+                    continue
+                emulator.deliver( frame )
+                self.stats['delivered'] = self.stats['delivered'] + 1
+
+
+class lora_bridge_emu:
+    # ==================================
+    # Constructor
+    #
+    # latency delays every response (s)
+    # without holding up the commands
+    # behind it, loss_rate drops that
+    # fraction of responses entirely
+    # ==================================
+    def __init__(self, channel = None, latency = 0.0, loss_rate = 0.0, seed = 0 ):
+        self.channel   = channel
+        self.latency   = latency
+        self.loss_rate = loss_rate
+        self.rng       = random.Random( seed )
+        self.stats     = { 'commands': 0, 'dropped': 0 }
+        self.binary  = False
+        self.rx_fifo = deque()
+        self.rx_lock = threading.Lock()
+        self.tx_due  = deque() # ( due time, data ) in send order
+
+        # --------------------------------
+        # Raw mode so the tty layer does not
+        # echo or translate line endings,
+        # the emulator echoes like the pico
+        # --------------------------------
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw( self.slave_fd )
+        self.port = os.ttyname( self.slave_fd )
+
+        self.text_buf = b""
+        self.decoder  = bridge.slip_decoder()
+        self.tx_buf   = bytearray( bridge.BIN_MAX_FRAME )
+
+        self.stop_event = threading.Event()
+        self.thread     = None
+
+        if channel is not None:
+            channel.attach( self )
+
+    # ==================================
+    # start()
+    # ==================================
+    def start( self ):
+        self.stop_event.clear()
+        self.thread = threading.Thread( target=self.__run, daemon=True )
+        self.thread.start()
+        return self
+
+    # ==================================
+    # stop()
+    # ==================================
+    def stop( self ):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        os.close( self.master_fd )
+        os.close( self.slave_fd )
+
+    # ==================================
+    # deliver() - frame heard over the air
+    # ==================================
+    def deliver( self, frame ):
+        with self.rx_lock:
+            self.rx_fifo.append( list( frame ) )
+
+    # ==================================
+    # __run()
+    # ==================================
+    def __run( self ):
+        while not self.stop_event.is_set():
+            # --------------------------------
+            # send every delayed response that
+            # is due and wake for the next one
+            # --------------------------------
+            while len( self.tx_due ) != 0 and self.tx_due[0][0] <= time.monotonic():
+                os.write( self.master_fd, self.tx_due.popleft()[1] )
+            wait = EMU_POLL_TIME
+            if len( self.tx_due ) != 0:
+                wait = min( wait, max( self.tx_due[0][0] - time.monotonic(), 0.0 ) )
+
+            readable, _, _ = select.select( [ self.master_fd ], [], [], wait )
+            if len( readable ) == 0:
+                continue
+
+            data = os.read( self.master_fd, 4096 )
+            if self.binary:
+                for packet in self.decoder.feed( data ):
+                    self.__handle_packet( packet )
+            else:
+                self.__handle_text( data )
+
+    # ==================================
+    # __handle_text()
+    # ==================================
+    def __handle_text( self, data ):
+        self.text_buf = self.text_buf + data
+        while b"\r" in self.text_buf:
+            line, self.text_buf = self.text_buf.split( b"\r", 1 )
+            line = line.decode( 'utf-8' ).strip()
+
+            response = self.__text_command( line )
+            self.__respond( ( line + "\r\n" + response + "\r\n" ).encode( 'utf-8' ) )
+
+            # rest of the buffer may already be binary packets
+            if self.binary:
+                rest, self.text_buf = self.text_buf, b""
+                for packet in self.decoder.feed( rest ):
+                    self.__handle_packet( packet )
+                return
+
+    # ==================================
+    # __text_command()
+    # ==================================
+    def __text_command( self, line ):
+        words = line.split()
+
+        if line.startswith( "lora send" ):
+            try:
+                frame = [ int( word, 16 ) for word in words[2:] ]
+            except ValueError:
+                return "Error: bad byte"
+            self.__transmit( frame )
+            return "OK"
+
+        if line == "lora get":
+            frame = self.__read_fifo()
+            if len( frame ) == 0:
+                return "Error: no message"
+            return " ".join( str( byte ) for byte in frame )
+
+        if line == "lora init rx":
+            return "OK"
+
+        if line == "lora binary":
+            self.binary = True
+            return "OK"
+
+        return "Error: unknown command"
+
+    # ==================================
+    # __handle_packet()
+    # ==================================
+    def __handle_packet( self, packet ):
+        parsed = bridge.parse_bin_packet( packet )
+        if parsed is None:
+            return
+        cmd, tag, data = parsed
+
+        rsp_cmd  = cmd | bridge.BIN_RSP_FLAG
+        rsp_data = b""
+        if cmd == bridge.BIN_CMD_SEND:
+            self.__transmit( list( data ) )
+        elif cmd == bridge.BIN_CMD_GET:
+            rsp_data = bytes( self.__read_fifo( bridge.BIN_MAX_DATA ) )
+        elif cmd == bridge.BIN_CMD_INIT_RX:
+            pass
+        elif cmd == bridge.BIN_CMD_TEXT:
+            self.binary = False
+        else:
+            rsp_cmd = bridge.BIN_RSP_ERROR
+
+        size = bridge.slip_pack( self.tx_buf, rsp_cmd, tag, rsp_data )
+        self.__respond( bytes( self.tx_buf[:size] ) )
+
+    # ==================================
+    # __transmit()
+    # ==================================
+    def __transmit( self, frame ):
+        if self.channel is not None:
+            self.channel.transmit( self, frame )
+
+    # ==================================
+    # __read_fifo() - frames received since
+    # the last read, back to back. With a
+    # limit only whole frames that fit are
+    # taken and the rest stay queued (a
+    # single frame over the limit is split)
+    # ==================================
+    def __read_fifo( self, limit = None ):
+        frame = []
+        with self.rx_lock:
+            while len( self.rx_fifo ) != 0:
+                if limit is not None and len( frame ) + len( self.rx_fifo[0] ) > limit:
+                    if len( frame ) == 0:
+                        head = self.rx_fifo.popleft()
+                        self.rx_fifo.appendleft( head[limit:] )
+                        frame = head[:limit]
+                    break
+                frame.extend( self.rx_fifo.popleft() )
+        return frame
+
+    # ==================================
+    # __respond()
+    # ==================================
+    def __respond( self, data ):
+        self.stats['commands'] = self.stats['commands'] + 1
+        if self.rng.random() < self.loss_rate:
+            self.stats['dropped'] = self.stats['dropped'] + 1
+            return
+        if self.latency > 0 or len( self.tx_due ) != 0:
+            # keeps responses in order behind
+            # any that are still delayed
+            self.tx_due.append( ( time.monotonic() + self.latency, data ) )
+            return
+        os.write( self.master_fd, data )
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    num_frames = 200
+    channel    = emu_channel()
+    emu_a      = lora_bridge_emu( channel ).start()
+    emu_b      = lora_bridge_emu( channel ).start()
+
+    for binary in ( False, True ):
+        node_a = bridge.lora_serial( port=emu_a.port, binary=binary )
+        node_b = bridge.lora_serial( port=emu_b.port, binary=binary )
+
+        num_rx = 0
+        start  = time.perf_counter()
+        for i in range( num_frames ):
+            node_a.LoraSendMessage( [ 0x01, 0x00, 0x00, 0x21, 0x00, i & 0xFF, 0x00 ], 7 )
+            node_a.LoraSetRxMode()
+            num_rx = num_rx + ( 1 if len( node_b.LoraReadMessageMulti() ) != 0 else 0 )
+        elapsed = time.perf_counter() - start
+
+        print( "{:<6}: {:6.3f} ms/frame, {}/{} frames rx'ed".format(
+            "binary" if binary else "text", elapsed / num_frames * 1e3, num_rx, num_frames ) )
+
+        if binary:
+            node_a.exit_binary_mode()
+            node_b.exit_binary_mode()
+
+    emu_a.stop()
+    emu_b.stop()
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
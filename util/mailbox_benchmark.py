@@ -0,0 +1,122 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       mailbox_benchmark.py - mailboxAPI tx_runtime() micro-benchmark
+#
+#   DESCRIPTION:
+#       Times Mailbox.tx_runtime() over a large synthetic mailbox map
+#       with every entry due each round. Run with and without the
+#       encoded payload cache to see its effect:
+#
+#           python -m lib.util.mailbox_benchmark
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import time
+from lib.mailbox import Mailbox, fixed_type, array_type
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+NUM_ENTRIES = 0xFE  # idx is one byte, 0xFE/0xFF are reserved
+NUM_ROUNDS  = 1000
+
+# types cycled through when building the synthetic map
+entry_templates = [
+    ( 7,         None                     ),
+    ( 1.5,       None                     ),
+    ( True,      None                     ),
+    ( 200,       'u8'                     ),
+    ( -1000,     'i16'                    ),
+    ( 0.5,       'f16'                    ),
+    ( 12.34,     fixed_type( 'i16', 100 ) ),
+    ( [1, 2, 3], array_type( 'u8', 3 )    ),
+]
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class null_messageAPI:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self):
+        self.currentModule = 0x00
+        self.listOfModules = [ 0x00 ]
+        self.module_all    = len( self.listOfModules ) + 1
+        self.num_tx        = 0
+
+    # ==================================
+    # TXMessage()
+    # ==================================
+    def TXMessage(self, message, destination, source=None):
+        self.num_tx = self.num_tx + 1
+        return True
+
+    # ==================================
+    # RX_Multi()
+    # ==================================
+    def RX_Multi(self, dest_list=None):
+        return None
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# build_map()
+# ==================================
+def build_map( num_entries ):
+    mailbox_map = []
+    for idx in range( num_entries ):
+        data, data_type = entry_templates[ idx % len( entry_templates ) ]
+        entry = [ data, '1', False, 'TX', 0x00, 0x01 ]
+        if data_type is not None:
+            entry.append( data_type )
+        mailbox_map.append( entry )
+
+    return mailbox_map
+
+# ==================================
+# run_benchmark()
+# ==================================
+def run_benchmark( num_entries, num_rounds, use_cache ):
+    msg_conn = null_messageAPI()
+    mailbox  = Mailbox( msg_conn, build_map( num_entries ) )
+
+    start = time.perf_counter()
+    for _ in range( num_rounds ):
+        # --------------------------------
+        # Pretend every entry was ack'ed
+        # so no resends are queued
+        # --------------------------------
+        for idx in mailbox.expecting_ack_map:
+            mailbox.expecting_ack_map[ idx ] = False
+
+        if not use_cache:
+            mailbox.encoded_cache.clear()
+
+        mailbox.tx_runtime()
+    elapsed = time.perf_counter() - start
+
+    return elapsed, msg_conn.num_tx
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    print( "tx_runtime() over {} entries, {} rounds".format( NUM_ENTRIES, NUM_ROUNDS ) )
+
+    for use_cache in ( False, True ):
+        elapsed, num_tx = run_benchmark( NUM_ENTRIES, NUM_ROUNDS, use_cache )
+        print( "  cache {:<5}: {:8.1f} us/round, {:6.1f} frames/round".format(
+            str( use_cache ), elapsed / NUM_ROUNDS * 1e6, num_tx / NUM_ROUNDS ) )
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
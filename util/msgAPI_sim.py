@@ -44,7 +44,7 @@ class messageAPI:
     # ==================================
     # Constructor
     # ==================================
-	def __init__(self, bus, chip_select, currentModule, listOfModules):
+	def __init__(self, bus, chip_select, currentModule, listOfModules, channel=None):
 		print(" WARNING: this is a simulation ONLY messageAPI")
 		#setup local var's
 		self.currentModule = currentModule
@@ -57,6 +57,12 @@ class messageAPI:
 	
 		self.rx_return_data = []
 
+		#optional virtual channel (see lora_network_sim.py). When set, Tx'ed
+		#frames are handed to the channel and Rx'ed frames are raw bytes
+		#that go through the real frame parsing
+		self.channel = channel
+		self.rx_raw_data = []
+
     # ==================================
     # InitAPI()
     # ==================================
@@ -64,10 +70,16 @@ class messageAPI:
 		self.__LoraInit()
 		self.__LoraSetRxMode()
 
+    # ==================================
+    # CheckInit()
+    # ==================================
+	def CheckInit(self):
+		return True
+
     # ==================================
     # TXMessage()
     # ==================================
-	def TXMessage(self, message, destination):
+	def TXMessage(self, message, destination, source=None):
 		#Verify variables
 		message_size = len(message)
 		if( message_size > 10):
@@ -86,17 +98,22 @@ class messageAPI:
 		# Byte 5 -- start of data region
 		# Byte X -- crc (last byte)
 		message.insert(0, destination)
-		message.insert(1, self.currentModule)
+		message.insert(1, self.currentModule if source is None else source)
 		message.insert(2, 0x00 )
 		message.insert(3, version_size_var )
 		message.insert(4, self.curr_key )
 		message.append(self.__updateCRC(message))
 
 		#send message
+		if self.channel is not None:
+			self.channel.transmit( self, message )
+			return True
+
 		print("Sending: {",end =" ")
 		for x in message:
 		    print(hex(x),end = " ")
 		print("}")
+		return True
 
 		
 
@@ -152,20 +169,39 @@ class messageAPI:
     # ==================================
     # RX_multi()
     # ==================================
-	def RX_Multi(self):
+	def RX_Multi(self, dest_list=None):
+		#raw frames from a virtual channel
+		if len(self.rx_raw_data) != 0:
+			return_msg = self.rx_raw_data
+			self.rx_raw_data = []
+			return self.__parseRawLora( return_msg, dest_list )
+
 		if len(self.rx_return_data) == 0:
 			return None
-		else:
+
+		rx_data = self.rx_return_data
+		self.rx_return_data = []
+
+		if dest_list is None:
 			# [ num_msg, [source, data, valid] ]
-			rtn_data = [ len(self.rx_return_data), self.rx_return_data ]
-			self.rx_return_data = []
-			return rtn_data
+			rx_data = [ [ src, data, valid ] for src, data, valid, dest in rx_data ]
+		else:
+			# [ num_msg, [source, data, valid, destination] ]
+			rx_data = [ msg for msg in rx_data if msg[3] in dest_list or msg[3] == self.module_all ]
+			if len(rx_data) == 0:
+				return None
+
+		return [ len(rx_data), rx_data ]
 		
 		
-	def rx_data_fill( self, data, src, validity ):
-		msg = [ src, data, validity ]
+	def rx_data_fill( self, data, src, validity, dest=None ):
+		msg = [ src, data, validity, self.currentModule if dest is None else dest ]
 		self.rx_return_data.append( msg )
 
+	def rx_raw_fill( self, frame ):
+		#frames are appended back to back, same as the radio fifo
+		self.rx_raw_data.extend( frame )
+
 
 
     # ==================================
@@ -193,8 +229,10 @@ class messageAPI:
     # ==================================
     # __parseRawLora()
     # ==================================
-	def __parseRawLora(self, message):
+	def __parseRawLora(self, message, dest_list=None):
 		#return format [ numRx, [[source, data, validity]] ]
+		#if dest_list is provided messages for any module in the list
+		#are accepted and format is [ numRx, [[source, data, validity, destination]] ]
 		num_rx = 0
 		start_index = 0
 		parsed_data = []
@@ -217,7 +255,12 @@ class messageAPI:
 			curr_msg = message[start_index:(start_index + 6 + dataSize)]
 
 			destination = curr_msg[0]
-			if destination == self.currentModule:
+			if dest_list is None:
+				accept = destination == self.currentModule or destination == self.module_all
+			else:
+				accept = destination in dest_list or destination == self.module_all
+
+			if accept:
 				source = curr_msg[1]
 				version = ( curr_msg[3] & 0xF0 ) >> 4
 				key = curr_msg[4]
@@ -234,7 +277,10 @@ class messageAPI:
 				else:
 					valid = True
 
-				parsed_data.append( [source, data, valid] )
+				if dest_list is None:
+					parsed_data.append( [source, data, valid] )
+				else:
+					parsed_data.append( [source, data, valid, destination] )
 				num_rx = num_rx + 1
 
 			start_index = start_index + 6 + dataSize
@@ -0,0 +1,238 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       pico_sim.py - simulated pico DUT
+#
+#   DESCRIPTION:
+#       Stands in for the pico on a simulated rig (hw mode "sim"). It
+#       answers the console on a pseudo-terminal, powers down and
+#       reboots when the power relay GPIO toggles (console goes quiet,
+#       test mode and radio are reset, ready pin drops) and owns a
+#       radio linked to the rig's sx127x model:
+#
+#           STF_HW=sim python -m lib.util.pico_sim
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import os
+import select
+import threading
+import tty
+
+from lib import hw
+from lib.util import sx127x_sim
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+SIM_BOOT_TIME   = 0.05 # time from power on to the boot banner (s)
+SIM_BOOT_BANNER = "Pico booted"
+SIM_POLL_TIME   = 0.05 # how often the console thread checks for stop (s)
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class pico_sim:
+    # ==================================
+    # Constructor
+    #
+    # gpio is the sim_gpio the rig uses,
+    # bus/chip_select pick the rig radio
+    # this pico's radio is linked to
+    # ==================================
+    def __init__(self, gpio, power_pin = 23, ready_pin = None, bus = 0, chip_select = 0,
+                 boot_time = SIM_BOOT_TIME, banner = SIM_BOOT_BANNER ):
+        self.gpio      = gpio
+        self.power_pin = power_pin
+        self.ready_pin = ready_pin
+        self.boot_time = boot_time
+        self.banner    = banner
+
+        self.powered    = True
+        self.test_mode  = False
+        self.boots      = 0
+        self.boot_timer = None
+        self.lock       = threading.Lock()
+
+        # --------------------------------
+        # command -> fn( line ) returning the
+        # response text, see add_command()
+        # --------------------------------
+        self.commands = { "": lambda line: "", "testmode": self.__testmode, "bootsel": self.__bootsel }
+
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw( self.slave_fd )
+        self.port     = os.ttyname( self.slave_fd )
+        self.text_buf = b""
+
+        self.rig_radio = sx127x_sim.get_radio( bus, chip_select )
+        self.radio     = None
+        self.__reset_radio()
+
+        self.gpio.add_callback( power_pin, self.__on_power )
+        if self.ready_pin is not None:
+            self.gpio.drive( self.ready_pin, self.gpio.HIGH )
+
+        self.stop_event = threading.Event()
+        self.thread     = None
+
+    # ==================================
+    # start()
+    # ==================================
+    def start( self ):
+        self.stop_event.clear()
+        self.thread = threading.Thread( target=self.__run, daemon=True )
+        self.thread.start()
+        return self
+
+    # ==================================
+    # stop()
+    # ==================================
+    def stop( self ):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        if self.boot_timer is not None:
+            self.boot_timer.cancel()
+        os.close( self.master_fd )
+        os.close( self.slave_fd )
+
+    # ==================================
+    # add_command() - fn( line ) returns
+    # the text printed after the echo
+    # ==================================
+    def add_command( self, name, fn ):
+        self.commands[ name ] = fn
+
+    # ==================================
+    # __on_power() - relay HIGH holds RUN
+    # low (off), LOW releases it (boot)
+    # ==================================
+    def __on_power( self, pin, level ):
+        with self.lock:
+            if self.boot_timer is not None:
+                self.boot_timer.cancel()
+                self.boot_timer = None
+
+            if level == self.gpio.HIGH:
+                self.powered   = False
+                self.test_mode = False
+                self.__reset_radio()
+                if self.ready_pin is not None:
+                    self.gpio.drive( self.ready_pin, self.gpio.LOW )
+                return
+
+            self.boot_timer = threading.Timer( self.boot_time, self.__boot )
+            self.boot_timer.start()
+
+    # ==================================
+    # __boot()
+    # ==================================
+    def __boot( self ):
+        with self.lock:
+            self.powered = True
+            self.boots   = self.boots + 1
+            self.radio.write_reg( sx127x_sim.REG_OP_MODE, sx127x_sim.MODE_LONG_RANGE | sx127x_sim.MODE_RX_CONTINUOUS )
+            os.write( self.master_fd, ( self.banner + "\r\n" ).encode( 'utf-8' ) )
+            if self.ready_pin is not None:
+                self.gpio.drive( self.ready_pin, self.gpio.HIGH )
+
+    # ==================================
+    # __reset_radio() - fresh radio (power
+    # on register values) on the same link
+    # ==================================
+    def __reset_radio( self ):
+        self.radio = sx127x_sim.sx127x()
+        sx127x_sim.link( self.rig_radio, self.radio )
+
+    # ==================================
+    # __run()
+    # ==================================
+    def __run( self ):
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select( [ self.master_fd ], [], [], SIM_POLL_TIME )
+            if len( readable ) == 0:
+                continue
+
+            data = os.read( self.master_fd, 4096 )
+            with self.lock:
+                if not self.powered:
+                    continue # console input is lost while off
+                self.__handle_text( data )
+
+    # ==================================
+    # __handle_text()
+    # ==================================
+    def __handle_text( self, data ):
+        self.text_buf = self.text_buf + data
+        while b"\r" in self.text_buf:
+            line, self.text_buf = self.text_buf.split( b"\r", 1 )
+            line = line.decode( 'utf-8' ).strip()
+
+            name = line.split( " " )[0] if len( line ) != 0 else ""
+            if name in self.commands:
+                response = self.commands[ name ]( line )
+            else:
+                response = "Error: unknown command"
+
+            output = line + "\r\n"
+            if len( response ) != 0:
+                output = output + response + "\r\n"
+            os.write( self.master_fd, output.encode( 'utf-8' ) )
+
+            if not self.powered:
+                self.text_buf = b""
+                return
+
+    # ==================================
+    # __testmode()
+    # ==================================
+    def __testmode( self, line ):
+        self.test_mode = not self.test_mode
+        return "Test Mode: {}".format( "enabled" if self.test_mode else "disabled" )
+
+    # ==================================
+    # __bootsel() - drops to the USB boot
+    # loader until the next power cycle
+    # ==================================
+    def __bootsel( self, line ):
+        self.powered = False
+        return ""
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    import time
+    from lib.pi_pico import pi_pico
+
+    hw.set_mode( "sim" )
+    gpio = hw.get_gpio()
+    sim  = pico_sim( gpio, ready_pin = 24 ).start()
+
+    start = time.perf_counter()
+    pico  = pi_pico( test_mode = True, ready_pin = 24, uart_port = sim.port, power_hold = 0.01 )
+    for i in range( 10 ):
+        pico.power_cycle()
+        pico.set_test_mode( True )
+    elapsed = time.perf_counter() - start
+
+    print( "11 power cycles in {:.3f} s, pico booted {} times".format( elapsed, sim.boots ) )
+    print( "boot stats: {}".format( pico.boot_stats() ) )
+    print( "relay toggles: {}".format( len( gpio.toggles( 23 ) ) ) )
+    print( "radio config held: {}".format( pico.msg_conn.CheckInit() ) )
+
+    pico.reset_on_exit = False
+    sim.stop()
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       results_merge.py - merge results logs into one suite report
+#
+#   DESCRIPTION:
+#       Reads the JSON lines logs written by results (one per test
+#       file) in a single pass each and writes a suite summary JSON
+#       with the totals and one entry per test, plus a JUnit XML file
+#       holding one testsuite per test for CI dashboards:
+#
+#           python -m lib.util.results_merge suite tests/*_results.jsonl
+#
+#       writes suite_summary.json and suite_results.xml. A log that
+#       cannot be read is reported as an errored testsuite and the merge
+#       carries on. Both files are written to a temp file and renamed
+#       once complete. Exits 1 if any test failed, never finished or
+#       has no readable log.
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from xml.sax.saxutils import quoteattr
+
+from lib import results
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+JUNIT_WRAPPER = [ "<?xml", "<testsuites>", "</testsuites>" ] # per test lines dropped when merging
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# merge() - returns the suite summary
+# ==================================
+def merge( log_paths, out_base ):
+    suite = { "tests": [], "total": 0, "passed": 0, "failed": 0, "incomplete": 0, "duration": 0.0, "result": "pass" }
+
+    with tempfile.TemporaryDirectory() as tmp_dir, replace_when_done( out_base + "_results.xml" ) as junit:
+        junit.write( "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n" )
+        junit.write( "<testsuites>\n" )
+
+        for i, log_path in enumerate( log_paths ):
+            # --------------------------------
+            # one pass per log builds both the
+            # summary and that test's suite
+            # --------------------------------
+            tmp_path = os.path.join( tmp_dir, "{}.xml".format( i ) )
+            try:
+                summary = results.export( log_path, [ results.junit_exporter( tmp_path ) ] )
+            except ( OSError, ValueError, KeyError ) as error:
+                write_unreadable_suite( junit, log_path, error )
+                suite["tests"].append( { "log": log_path, "complete": False, "result": "error", "error": str( error ) } )
+                suite["incomplete"] = suite["incomplete"] + 1
+                suite["result"]     = "fail"
+                continue
+
+            with open( tmp_path, "r" ) as f:
+                for line in f:
+                    if not any( line.startswith( tag ) for tag in JUNIT_WRAPPER ):
+                        junit.write( line )
+
+            suite["tests"].append( dict( summary, log = log_path ) )
+            suite["total"]    = suite["total"] + summary["tests"]
+            suite["passed"]   = suite["passed"] + summary["passed"]
+            suite["failed"]   = suite["failed"] + summary["failed"]
+            suite["duration"] = suite["duration"] + summary["duration"]
+            if not summary["complete"]:
+                suite["incomplete"] = suite["incomplete"] + 1
+            if summary["result"] != "pass":
+                suite["result"] = "fail"
+
+        junit.write( "</testsuites>\n" )
+
+    with replace_when_done( out_base + "_summary.json" ) as f:
+        json.dump( suite, f, indent=2 )
+
+    return suite
+
+# ==================================
+# write_unreadable_suite() - a testsuite
+# with one errored case standing in for
+# a log that could not be read
+# ==================================
+def write_unreadable_suite( junit, log_path, error ):
+    name = quoteattr( results.xml_text( os.path.basename( log_path ) ) )
+    junit.write( "<testsuite name={} tests=\"1\" failures=\"0\" errors=\"1\" time=\"0.000000\">\n".format( name ) )
+    junit.write( "  <testcase classname={} name=\"unreadable\" time=\"0.000000\">\n".format( name ) )
+    junit.write( "    <error message={}/>\n  </testcase>\n".format(
+        quoteattr( results.xml_text( "results log could not be read: {}".format( error ) ) ) ) )
+    junit.write( "</testsuite>\n" )
+
+# ==================================
+# replace_when_done() - writes through a
+# temp file next to path, renamed over
+# it only once the block completes
+# ==================================
+@contextmanager
+def replace_when_done( path ):
+    out_dir = os.path.dirname( os.path.abspath( path ) )
+    with tempfile.NamedTemporaryFile( "w", dir=out_dir, suffix=".tmp", delete=False ) as f:
+        try:
+            yield f
+        except BaseException:
+            f.close()
+            os.remove( f.name )
+            raise
+    os.replace( f.name, path )
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    if len( sys.argv ) < 3:
+        print( "usage: python -m lib.util.results_merge <output base> <results log> ..." )
+        return 2
+
+    suite = merge( sys.argv[2:], sys.argv[1] )
+    print( "{} tests, {} cases: {} passed, {} failed, {} incomplete tests".format(
+        len( suite["tests"] ), suite["total"], suite["passed"], suite["failed"], suite["incomplete"] ) )
+    print( "Overall Result: {}".format( suite["result"] ) )
+    return 0 if suite["result"] == "pass" else 1
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,329 @@
+#*********************************************************************
+#
+#   MODULE NAME:
+#       sx127x_sim.py - simulated SX127x radio behind a fake spidev
+#
+#   DESCRIPTION:
+#       Register/FIFO level model of the SX127x LoRa radio. A fake
+#       spidev module routes SpiDev.xfer2() to the model so the real
+#       msgAPI.messageAPI can run unchanged off target, while counting
+#       SPI transactions. Only the registers msgAPI touches are modelled.
+#
+#           from lib import hw
+#           hw.set_mode( "sim" )                 # msgAPI gets SpiDev from here
+#           from lib.msgAPI import messageAPI
+#
+#       Radios are looked up in lib.util.sx127x_sim's registry, so code
+#       run as __main__ must go through that module, not its own copy.
+#
+#   Copyright 2025 by Nate Lenze
+#*********************************************************************
+
+#---------------------------------------------------------------------
+#                              IMPORTS
+#---------------------------------------------------------------------
+import sys
+import types
+
+#---------------------------------------------------------------------
+#                             VARIABLES
+#---------------------------------------------------------------------
+REG_FIFO            = 0x00
+REG_OP_MODE         = 0x01
+REG_PA_CONFIG       = 0x09
+REG_FIFO_ADDR_PTR   = 0x0D
+REG_FIFO_TX_BASE    = 0x0E
+REG_FIFO_RX_BASE    = 0x0F
+REG_FIFO_RX_CURRENT = 0x10
+REG_IRQ_FLAGS       = 0x12
+REG_RX_NB_BYTES     = 0x13
+REG_PAYLOAD_LENGTH  = 0x22
+REG_DIO_MAPPING_1   = 0x40
+
+IRQ_RX_TIMEOUT      = 0x80
+IRQ_RX_DONE         = 0x40
+IRQ_CRC_ERROR       = 0x20
+IRQ_VALID_HEADER    = 0x10
+IRQ_TX_DONE         = 0x08
+
+MODE_LONG_RANGE     = 0x80
+MODE_MASK           = 0x07
+MODE_SLEEP          = 0x00
+MODE_STDBY          = 0x01
+MODE_TX             = 0x03
+MODE_RX_CONTINUOUS  = 0x05
+
+FIFO_SIZE           = 0x100
+FIFO_RX_SIZE        = 0x80  # rx data rolls over within the lower half
+
+# (bus, chip_select) -> sx127x, shared by every SpiDev opened on it
+radios = {}
+
+#---------------------------------------------------------------------
+#                              CLASSES
+#---------------------------------------------------------------------
+class sx127x:
+    # ==================================
+    # Constructor
+    # ==================================
+    def __init__(self, on_tx = None ):
+        self.regs = bytearray( 0x80 )
+        self.fifo = bytearray( FIFO_SIZE )
+        self.on_tx = on_tx # called with each Tx'ed frame
+
+        self.regs[ REG_OP_MODE ]      = MODE_STDBY
+        self.regs[ REG_FIFO_TX_BASE ] = 0x80
+        self.regs[ REG_FIFO_RX_BASE ] = 0x00
+        self.rx_write_ptr             = 0x00
+
+        self.stats = { 'xfers': 0, 'fifo_reads': 0, 'fifo_writes': 0, 'reg_reads': 0,
+                       'reg_writes': 0, 'tx_frames': 0, 'rx_frames': 0, 'rx_dropped': 0 }
+
+    # ==================================
+    # mode()
+    # ==================================
+    def mode( self ):
+        return self.regs[ REG_OP_MODE ] & MODE_MASK
+
+    # ==================================
+    # xfer() - one SPI transaction
+    # ==================================
+    def xfer( self, msg ):
+        self.stats['xfers'] = self.stats['xfers'] + 1
+
+        addr  = msg[0] & 0x7F
+        write = ( msg[0] & 0x80 ) == 0x80
+        rtn   = [ 0x00 ]
+
+        # --------------------------------
+        # Burst access, address increments
+        # for every register except FIFO
+        # --------------------------------
+        for value in msg[1:]:
+            if write:
+                self.write_reg( addr, value )
+                rtn.append( 0x00 )
+            else:
+                rtn.append( self.read_reg( addr ) )
+            if addr != REG_FIFO:
+                addr = ( addr + 1 ) & 0x7F
+
+        return rtn
+
+    # ==================================
+    # write_reg()
+    # ==================================
+    def write_reg( self, addr, value ):
+        if addr == REG_FIFO:
+            self.stats['fifo_writes'] = self.stats['fifo_writes'] + 1
+            ptr = self.regs[ REG_FIFO_ADDR_PTR ]
+            self.fifo[ ptr ] = value
+            self.regs[ REG_FIFO_ADDR_PTR ] = self.__next_ptr( ptr )
+            return
+
+        self.stats['reg_writes'] = self.stats['reg_writes'] + 1
+
+        # --------------------------------
+        # IRQ flags are write 1 to clear
+        # --------------------------------
+        if addr == REG_IRQ_FLAGS:
+            self.regs[ REG_IRQ_FLAGS ] = self.regs[ REG_IRQ_FLAGS ] & ( ~value & 0xFF )
+            return
+
+        if addr == REG_OP_MODE:
+            self.__set_mode( value )
+            return
+
+        self.regs[ addr ] = value
+
+    # ==================================
+    # read_reg()
+    # ==================================
+    def read_reg( self, addr ):
+        if addr == REG_FIFO:
+            self.stats['fifo_reads'] = self.stats['fifo_reads'] + 1
+            ptr = self.regs[ REG_FIFO_ADDR_PTR ]
+            self.regs[ REG_FIFO_ADDR_PTR ] = self.__next_ptr( ptr )
+            return self.fifo[ ptr ]
+
+        self.stats['reg_reads'] = self.stats['reg_reads'] + 1
+        return self.regs[ addr ]
+
+    # ==================================
+    # receive() - a frame arrives over
+    # the air
+    # ==================================
+    def receive( self, frame, crc_error = False ):
+        if self.mode() != MODE_RX_CONTINUOUS or len( frame ) > FIFO_RX_SIZE:
+            self.stats['rx_dropped'] = self.stats['rx_dropped'] + 1
+            return
+
+        self.stats['rx_frames'] = self.stats['rx_frames'] + 1
+
+        # --------------------------------
+        # In continuous Rx the write ptr is
+        # not reset between packets, so
+        # data rolls over in the rx region
+        # --------------------------------
+        start = self.rx_write_ptr
+        for value in frame:
+            self.fifo[ self.rx_write_ptr ] = value
+            self.rx_write_ptr = ( self.rx_write_ptr + 1 ) % FIFO_RX_SIZE
+
+        self.regs[ REG_FIFO_RX_CURRENT ] = start
+        self.regs[ REG_RX_NB_BYTES ]     = len( frame )
+        self.regs[ REG_IRQ_FLAGS ]       = self.regs[ REG_IRQ_FLAGS ] | IRQ_RX_DONE | IRQ_VALID_HEADER
+        if crc_error:
+            self.regs[ REG_IRQ_FLAGS ] = self.regs[ REG_IRQ_FLAGS ] | IRQ_CRC_ERROR
+
+    # ==================================
+    # rx_raw_fill() - lets the radio be
+    # attached to a lora_network_sim
+    # virtual_channel
+    # ==================================
+    def rx_raw_fill( self, frame ):
+        self.receive( frame )
+
+    # ==================================
+    # __set_mode()
+    # ==================================
+    def __set_mode( self, value ):
+        old_mode = self.mode()
+        self.regs[ REG_OP_MODE ] = value
+        new_mode = self.mode()
+
+        # --------------------------------
+        # FIFO is cleared in sleep mode
+        # --------------------------------
+        if new_mode == MODE_SLEEP:
+            self.fifo = bytearray( FIFO_SIZE )
+
+        if new_mode == MODE_RX_CONTINUOUS and old_mode != MODE_RX_CONTINUOUS:
+            self.rx_write_ptr = self.regs[ REG_FIFO_RX_BASE ]
+
+        # --------------------------------
+        # Tx completes instantly, airtime
+        # is modelled by the channel
+        # --------------------------------
+        if new_mode == MODE_TX:
+            base  = self.regs[ REG_FIFO_TX_BASE ]
+            frame = [ self.fifo[ ( base + i ) % FIFO_SIZE ] for i in range( self.regs[ REG_PAYLOAD_LENGTH ] ) ]
+            self.stats['tx_frames'] = self.stats['tx_frames'] + 1
+
+            self.regs[ REG_IRQ_FLAGS ] = self.regs[ REG_IRQ_FLAGS ] | IRQ_TX_DONE
+            self.regs[ REG_OP_MODE ]   = ( value & ~MODE_MASK ) | MODE_STDBY
+
+            if self.on_tx is not None:
+                self.on_tx( self, frame )
+
+    # ==================================
+    # __next_ptr() - ptr wraps within
+    # the rx (lower) or tx (upper) half
+    # ==================================
+    def __next_ptr( self, ptr ):
+        if ptr < FIFO_RX_SIZE:
+            return ( ptr + 1 ) % FIFO_RX_SIZE
+        return FIFO_RX_SIZE + ( ( ptr + 1 - FIFO_RX_SIZE ) % ( FIFO_SIZE - FIFO_RX_SIZE ) )
+
+
+class SpiDev:
+    # ==================================
+    # Constructor (spidev.SpiDev API)
+    # ==================================
+    def __init__(self):
+        self.radio        = None
+        self.max_speed_hz = 0
+        self.mode         = 0
+
+    # ==================================
+    # open()
+    # ==================================
+    def open( self, bus, chip_select ):
+        self.radio = get_radio( bus, chip_select )
+
+    # ==================================
+    # close()
+    # ==================================
+    def close( self ):
+        self.radio = None
+
+    # ==================================
+    # xfer2()
+    # ==================================
+    def xfer2( self, msg ):
+        return self.radio.xfer( msg )
+
+#---------------------------------------------------------------------
+#                             FUNCTIONS
+#---------------------------------------------------------------------
+# ==================================
+# get_radio()
+# ==================================
+def get_radio( bus, chip_select ):
+    if ( bus, chip_select ) not in radios:
+        radios[ ( bus, chip_select ) ] = sx127x()
+    return radios[ ( bus, chip_select ) ]
+
+# ==================================
+# install() - registers this module as
+# spidev so msgAPI picks it up
+# ==================================
+def install():
+    fake_spidev = types.ModuleType( "spidev" )
+    fake_spidev.SpiDev = SpiDev
+    sys.modules[ "spidev" ] = fake_spidev
+    return fake_spidev
+
+# ==================================
+# link() - point to point link, every
+# frame one radio Tx's is Rx'ed by the
+# other
+# ==================================
+def link( radio_a, radio_b ):
+    radio_a.on_tx = lambda radio, frame: radio_b.receive( frame )
+    radio_b.on_tx = lambda radio, frame: radio_a.receive( frame )
+
+#---------------------------------------------------------------------
+#                               MAIN
+#---------------------------------------------------------------------
+def main():
+    from lib import hw
+    from lib.msgAPI import messageAPI
+    from lib.util import sx127x_sim as model # the copy hw.get_spi() uses
+
+    hw.set_mode( "sim" )
+
+    node_a = messageAPI( bus = 0, chip_select = 0, currentModule = 0x00, listOfModules = [ 0x00, 0x01 ] )
+    node_b = messageAPI( bus = 0, chip_select = 1, currentModule = 0x01, listOfModules = [ 0x00, 0x01 ] )
+    node_a.InitAPI()
+    node_b.InitAPI()
+
+    radio_a = model.get_radio( 0, 0 )
+    radio_b = model.get_radio( 0, 1 )
+    model.link( radio_a, radio_b )
+
+    # ------------------------------------
+    # Send enough frames (of varying size)
+    # between reads to roll the rx fifo
+    # over mid frame
+    # ------------------------------------
+    num_sent = 0
+    num_rx   = 0
+    for burst in range( 20 ):
+        for i in range( 3 ):
+            node_a.TXMessage( [ burst ] * ( ( burst + i ) % 10 + 1 ), 0x01 )
+            num_sent = num_sent + 1
+
+        rtn = node_b.RX_Multi()
+        if rtn is not None:
+            num_rx = num_rx + sum( 1 for src, data, valid in rtn[1] if valid )
+
+    print( "frames sent: {}, valid frames rx'ed: {}".format( num_sent, num_rx ) )
+    print( "tx radio: {}".format( radio_a.stats ) )
+    print( "rx radio: {}".format( radio_b.stats ) )
+
+#---------------------------------------------------------------------
+#                              RUN
+#---------------------------------------------------------------------
+if __name__ == "__main__":
+    main()